@@ -1,41 +1,78 @@
-import streamlit as st
-from textwrap import dedent
-from langchain_openai import ChatOpenAI
-from langchain.agents import initialize_agent, Tool
-from langchain_community.utilities import SerpAPIWrapper
-from langchain.memory import ConversationBufferMemory
-from langchain.agents.agent_types import AgentType
-from datetime import datetime, timedelta
-import uuid
+import functools
+import importlib.util
 import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import streamlit as st
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from call_policy import attempt_summary, get_call_policy
+from comparison import MAX_COMPARED_DESTINATIONS, parse_destinations, run_comparison
+from destinations import LOCATION_COORDS
+from jobs import get_job_runner
+from llm_client import configure_llm_clients, count_llm_calls, get_llm
+from quota import QueueStatus, all_scheduler_stats, get_scheduler, set_quota_session
+from response_cache import ResponseCache, DEFAULT_CACHE_PATH, make_cache_key
+from recommendations import (
+    DEFAULT_PREFERENCES,
+    RecommendationOptions,
+    format_options_markdown,
+    recommendation_prompt,
+    run_recommendations,
+)
+from prompts import build_prompt, shared_prefix
+from research_store import ResearchStore, DEFAULT_RESEARCH_MAX_AGE_SECONDS, DEFAULT_RESEARCH_STORE_PATH, stored_research
+from search_cache import CachedSearch, DEFAULT_SEARCH_CACHE_PATH, DEFAULT_SEARCH_TTLS, search_ttls_from_env
+from research_sections import count_tokens, research_for_prompts
+from streaming import timed_stream
 
-# Optional imports with error handling
-try:
-    import pdfkit
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
-
-try:
-    from ics import Calendar, Event
-    ICS_AVAILABLE = True
-except ImportError:
-    ICS_AVAILABLE = False
-
-try:
-    import folium
-    from streamlit_folium import st_folium
-    MAP_AVAILABLE = True
-except ImportError:
-    MAP_AVAILABLE = False
+# Optional map libraries are only checked for here and imported when the map is drawn
+MAP_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("folium", "streamlit_folium"))
 
 load_dotenv()
 
+
+@st.cache_resource
+def get_response_cache():
+    """Process-wide LLM response cache shared by all reruns and sessions"""
+    return ResponseCache(
+        path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500")),
+        ttl_seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600))),
+    )
+
+
+@st.cache_resource
+def get_search_cache():
+    """Process-wide SerpAPI result cache shared by all reruns and sessions"""
+    return ResponseCache(
+        path=os.getenv("SEARCH_CACHE_PATH", DEFAULT_SEARCH_CACHE_PATH),
+        max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000")),
+        ttl_seconds=int(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(DEFAULT_SEARCH_TTLS["default"]))),
+    )
+
+
+@st.cache_resource
+def get_research_store():
+    """Process-wide research results shared by every session planning a matching trip"""
+    return ResearchStore(
+        path=os.getenv("RESEARCH_STORE_PATH", DEFAULT_RESEARCH_STORE_PATH),
+        max_age_seconds=int(os.getenv("RESEARCH_STORE_MAX_AGE_SECONDS", str(DEFAULT_RESEARCH_MAX_AGE_SECONDS))),
+    )
+
+
 st.set_page_config(page_title="✈️ AI Travel Planner", layout="centered")
 st.title("AI Travel Planner ✈️ with Researcher & Planner Agents")
 st.caption("Plan your trip with GPT-4.1 via GitHub Models, LangChain, SerpAPI !")
 
+response_cache = get_response_cache()
+search_cache = get_search_cache()
+research_store = get_research_store()
+job_runner = get_job_runner()
+
 # Initialize session state
 if "trip_history" not in st.session_state:
     st.session_state.trip_history = []
@@ -45,6 +82,163 @@ if "current_trip_data" not in st.session_state:
     st.session_state.current_trip_data = None
 if "show_preferences" not in st.session_state:
     st.session_state.show_preferences = False
+if "session_id" not in st.session_state:
+    # A refreshed page carries on as the session that started the background jobs named in its URL
+    st.session_state.session_id = st.query_params.get("session") or str(uuid.uuid4())
+if "llm_calls" not in st.session_state:
+    st.session_state.llm_calls = {"calls": 0, "reruns": 0}
+
+# Count reruns and the LLM calls each one makes, so widget interactions that trigger calls stand out
+st.session_state.llm_calls["reruns"] += 1
+run_start_llm_calls = st.session_state.llm_calls.get("calls", 0)
+count_llm_calls(st.session_state.llm_calls)
+
+
+def queue_renderer(placeholder, status):
+    """Draw the queue positions waiting workers recorded in status; only ever called on the script thread"""
+    def render():
+        positions = status.positions()
+        if positions:
+            placeholder.info("\n\n".join(
+                f"⏳ Waiting for {kind} quota: position {position} of {depth} in the shared queue"
+                for kind, (position, depth) in positions.items()
+            ))
+        else:
+            placeholder.empty()
+    return render
+
+
+def timed_fragment(name):
+    """st.fragment that records how long each run of it takes, split into full-page runs and its own reruns"""
+    def decorate(render):
+        @functools.wraps(render)
+        def run(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return render(*args, **kwargs)
+            finally:
+                ctx = get_script_run_ctx()
+                kind = "fragment" if ctx is not None and ctx.fragment_ids_this_run else "full"
+                timings = st.session_state.setdefault("fragment_timings", {}).setdefault(
+                    name, {"full": 0, "fragment": 0}
+                )
+                timings[kind] += 1
+                timings[f"last_{kind}_seconds"] = time.perf_counter() - start
+        return st.fragment(run)
+    return decorate
+
+
+def itinerary_key(trip_data):
+    return (trip_data["destination"], trip_data["num_days"], trip_data["budget"], trip_data["language"])
+
+
+def owned_job(job_id):
+    """The job with this id if this session started it, else None"""
+    job = job_runner.get(job_id)
+    return job if job is not None and job.session_id == st.session_state.session_id else None
+
+
+def adopt_jobs():
+    """Pick up the background jobs a refreshed page's previous session left running, but only that session's"""
+    for kind in ("research", "planner"):
+        job_id = st.query_params.get(f"{kind}_job")
+        if job_id and owned_job(job_id) is not None:
+            st.session_state.jobs[kind] = job_id
+        elif job_id:
+            # Expired, from before a server restart, or another session's job
+            forget_job(kind)
+
+
+def start_job(kind, fn, *args, meta=None):
+    """Run fn(job, *args) in the background as this session's job of the given kind, replacing any it already has"""
+    if kind in st.session_state.jobs:
+        job_runner.cancel(st.session_state.jobs[kind])
+    job = job_runner.submit(kind, fn, *args, session_id=st.session_state.session_id, meta=meta)
+    st.session_state.jobs[kind] = job.id
+    # Also kept in the URL with the owning session, so a browser refresh finds the job again
+    st.query_params["session"] = st.session_state.session_id
+    st.query_params[f"{kind}_job"] = job.id
+    return job
+
+
+def forget_job(kind):
+    st.session_state.jobs.pop(kind, None)
+    st.query_params.pop(f"{kind}_job", None)
+    if not st.session_state.jobs:
+        st.query_params.pop("session", None)
+
+
+def finished_job(kind):
+    """Take this session's job of the given kind once it has finished; None while it is still running"""
+    job_id = st.session_state.jobs.get(kind)
+    if job_id is None:
+        return None
+    job = owned_job(job_id)
+    if job is not None and not job.finished:
+        return None
+    # Unknown ids are jobs that expired or ran before a server restart
+    forget_job(kind)
+    if job is not None:
+        job_runner.discard(job_id)
+    return job
+
+
+@st.fragment(run_every=float(os.getenv("JOB_POLL_SECONDS", "1")))
+def job_progress(kind, label):
+    """Poll a background job until it finishes, then rerun the page to pick up its result"""
+    job = owned_job(st.session_state.jobs.get(kind))
+    if job is None or job.finished:
+        st.rerun()
+    st.info(f"{label}: {job.waiting or job.progress} ({job.elapsed_seconds():.0f}s)")
+    if job.partial:
+        st.markdown(job.partial)
+    if st.button("✖️ Cancel", key=f"cancel_{kind}_job"):
+        job_runner.cancel(job.id)
+        forget_job(kind)
+        st.rerun()
+
+
+if "jobs" not in st.session_state:
+    st.session_state.jobs = {}
+    adopt_jobs()
+
+
+def run_research_job(job, llm, search, trip_data):
+    job.report("Researching your destination")
+    # Checked between the researcher's model calls and searches, so Cancel stops it paying for more
+    return stored_research(
+        research_store, llm, search, trip_data, policy=get_call_policy("research"), checkpoint=job.raise_if_cancelled
+    )
+
+
+def run_planner_job(job, planner_llm, planner_input):
+    """Write the itinerary, streaming it into the job's partial output unless PLANNER_STREAMING=0"""
+    planner_timings = {}
+    if os.getenv("PLANNER_STREAMING", "1") == "1":
+        job.report("Writing your itinerary")
+        itinerary_text = ""
+        for token in timed_stream(planner_llm, planner_input, planner_timings, get_call_policy("planner")):
+            # Closing the stream early stops paying for tokens nobody will read
+            job.raise_if_cancelled()
+            itinerary_text += token
+            job.report(partial=itinerary_text)
+    else:
+        job.report("Creating your personalized itinerary based on your preferences")
+        planner_start = time.perf_counter()
+        itinerary_text = get_call_policy("planner").call(planner_llm.invoke, planner_input).content
+        planner_timings["total_seconds"] = time.perf_counter() - planner_start
+        planner_timings["ttft_seconds"] = planner_timings["total_seconds"]
+    return itinerary_text, planner_timings
+
+
+# SerpAPI and LLM requests from every session share one quota, handed out in turn per session
+if "quota_status" not in st.session_state:
+    st.session_state.quota_status = QueueStatus()
+set_quota_session(
+    st.session_state.session_id,
+    feedback=st.session_state.quota_status,
+    render=queue_renderer(st.sidebar.empty(), st.session_state.quota_status),
+)
 
 # --- Inputs ---
 github_token = os.getenv("GITHUB_TOKEN")
@@ -53,6 +247,14 @@ serp_api_key = os.getenv("SERPAPI_API_KEY")
 if not github_token or not serp_api_key:
     st.warning("Please set your GITHUB_TOKEN and SERPAPI_API_KEY in the .env file.")
 
+# Shared keep-alive connection pool for every LLM call site
+if github_token:
+    configure_llm_clients(
+        github_token,
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+        keepalive_seconds=int(os.getenv("LLM_KEEPALIVE_SECONDS", "60")),
+    )
+
 destination = st.text_input("Where do you want to go?")
 num_days = st.number_input("How many days do you want to travel for?", min_value=1, max_value=30, value=7)
 budget = st.number_input("Budget (total amount in INR)", min_value=5000, max_value=5000000, value=100000, step=5000)
@@ -67,106 +269,472 @@ if generate_clicked:
         st.error("Please enter your travel destination.")
     else:
         # Use GitHub Models instead of OpenAI API
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            openai_api_key=github_token,
-            openai_api_base="https://models.inference.ai.azure.com"
-        )
-        
-        search = SerpAPIWrapper(serpapi_api_key=serp_api_key)
-        search_tool = Tool(
-            name="search_google",
-            func=search.run,
-            description="Searches for travel info related to destinations and activities."
+        from cassette import make_search
+
+        llm = get_llm()
+        search = CachedSearch(
+            make_search(serp_api_key),
+            search_cache,
+            ttls=search_ttls_from_env(),
+            quota=get_scheduler("search"),
         )
-        memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+        trip_data = {
+            "destination": destination,
+            "num_days": num_days,
+            "budget": budget,
+            "language": language
+        }
 
-        researcher_prompt = dedent(
-            f"""
-            CRITICAL: Respond ONLY in {language} language. All research findings must be presented in {language}.
-            
-            You are a world-class travel researcher. Given a travel destination and the number of days the user wants to travel for,
-            generate a list of 3 search terms for relevant travel activities and accommodations.
-            Then search the web for each term, analyze the results, and return the most relevant results.
-            The user has a ₹{budget} INR budget and prefers the itinerary in {language}.
+        # Research runs in the background, so a rerun or refresh while it works loses nothing
+        start_job("research", run_research_job, llm, search, trip_data, meta={"trip_data": trip_data})
+
+# Pick up research and itineraries that finished in the background since the last run
+research_job = finished_job("research")
+if research_job is not None and research_job.state == "done":
+    # Store research results and trip data in session state
+    st.session_state.research_results, st.session_state.last_research_metrics = research_job.result
+    st.session_state.current_trip_data = research_job.meta["trip_data"]
+    st.session_state.show_preferences = True
+    st.success("✓ Research completed! Now select your preferences below.")
+elif research_job is not None and research_job.state == "failed":
+    st.error(f"❌ Research failed: {research_job.error}")
+elif "research" in st.session_state.jobs:
+    job_progress("research", "🔍 Researching your destination")
+
+planner_job = finished_job("planner")
+if planner_job is not None and planner_job.state == "done":
+    itinerary_text, planner_timings = planner_job.result
+    planned_trip = planner_job.meta["trip_data"]
+    st.session_state.last_planner_timings = planner_timings
+
+    # Save to session with all data including preferences and specific selections
+    st.session_state.trip_history.append({
+        "id": str(uuid.uuid4())[:8],
+        "destination": planned_trip['destination'],
+        "days": planned_trip['num_days'],
+        "budget": planned_trip['budget'],
+        "language": planned_trip['language'],
+        "itinerary": itinerary_text,
+        "research": planner_job.meta["research"],
+        "timings": planner_timings,
+        "preferences": planner_job.meta["preferences"],
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
+    })
+    # Keep the itinerary for this trip, so it outlives the run that picked it up and exports never plan again
+    st.session_state.setdefault("itineraries", {})[itinerary_key(planned_trip)] = st.session_state.trip_history[-1]
+    st.session_state.research_results = planner_job.meta["research"]
+    st.session_state.current_trip_data = planned_trip
+    st.session_state.show_preferences = True
+elif "planner" in st.session_state.jobs and not st.session_state.show_preferences:
+    # A refreshed page still planning: bring back the trip it is planning for
+    running_planner = job_runner.get(st.session_state.jobs["planner"])
+    if running_planner is not None:
+        st.session_state.research_results = running_planner.meta["research"]
+        st.session_state.current_trip_data = running_planner.meta["trip_data"]
+        st.session_state.show_preferences = True
+
+# Compare a shortlist of destinations side by side, researching them all at once
+with st.expander("⚖️ Compare destinations"):
+    compare_text = st.text_area(
+        f"Destinations to compare (2-{MAX_COMPARED_DESTINATIONS}, comma-separated)",
+        placeholder="Goa, Kerala, Jaipur",
+    )
+    compare_clicked = st.button("⚖️ Compare Destinations")
+    comparison_table = st.empty()
+    if compare_clicked:
+        compare_destinations = parse_destinations(compare_text)
+        if not (github_token and serp_api_key):
+            st.error("Please set your GITHUB_TOKEN and SERPAPI_API_KEY in the .env file.")
+        elif len(compare_destinations) < 2:
+            st.error("Please enter at least two destinations to compare.")
+        else:
+            from cassette import make_search
+
+            compare_search = CachedSearch(
+                make_search(serp_api_key), search_cache, ttls=search_ttls_from_env(), quota=get_scheduler("search")
+            )
+            compare_trips = [
+                {"destination": name, "num_days": num_days, "budget": budget, "language": language}
+                for name in compare_destinations
+            ]
+            with st.spinner(f"🔍 Researching {len(compare_trips)} destinations..."):
+                # Rows fill in as each destination's research finishes
+                comparison_rows, comparison_research, comparison_seconds = run_comparison(
+                    research_store,
+                    get_llm(),
+                    compare_search,
+                    compare_trips,
+                    policy=get_call_policy("research"),
+                    on_result=comparison_table.table,
+                )
+            st.session_state.comparison = {
+                "rows": comparison_rows,
+                "research": comparison_research,
+                "trips": {trip["destination"]: trip for trip in compare_trips},
+                "seconds": comparison_seconds,
+            }
+    if "comparison" in st.session_state:
+        comparison = st.session_state.comparison
+        comparison_table.table(comparison["rows"])
+        st.caption(f"Researched {len(comparison['rows'])} destinations in {comparison['seconds']:.1f}s")
+        # Continue planning any compared destination with the research already done
+        plan_columns = st.columns(len(comparison["research"]) or 1)
+        for column, (compared, compared_research) in zip(plan_columns, comparison["research"].items()):
+            if column.button(f"Plan {compared}", key=f"plan_compared_{compared}"):
+                st.session_state.research_results = compared_research
+                st.session_state.current_trip_data = comparison["trips"][compared]
+                st.session_state.show_preferences = True
+                st.rerun()
+
+
+@timed_fragment("export")
+def export_section(trip_data, trip):
+    """PDF and calendar downloads built from a stored itinerary, without calling the planner"""
+    itinerary_text = trip["itinerary"]
+    research_results = trip["research"]
+    preferences = trip["preferences"]
+    accommodation_pref, selected_accommodation = preferences["accommodation"], preferences["selected_accommodation"]
+    activity_pref, selected_activities = preferences["activities"], preferences["selected_activities"]
+    dining_pref, selected_dining = preferences["dining"], preferences["selected_dining"]
+    transport_pref, selected_transport = preferences["transportation"], preferences["selected_transport"]
+    special_requests = preferences["special_requests"]
+
+    st.subheader("📥 Export Your Itinerary")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # PDF Export with multiple fallback methods
+        if st.button("📄 Generate PDF", type="primary"):
+            export_trip_id = str(uuid.uuid4())[:8]
+            with st.spinner("📄 Generating PDF..."):
+                try:
+                    # Create clean HTML for PDF
+                    html_content = f"""
+                    <!DOCTYPE html>
+                    <html>
+                    <head>
+                        <meta charset="UTF-8">
+                        <title>Travel Itinerary - {trip_data['destination']}</title>
+                        <style>
+                            body {{ 
+                                font-family: Arial, sans-serif; 
+                                margin: 20px; 
+                                line-height: 1.6; 
+                                color: #333;
+                            }}
+                            .header {{ 
+                                text-align: center; 
+                                color: #2E86AB; 
+                                margin-bottom: 30px; 
+                                border-bottom: 2px solid #2E86AB;
+                                padding-bottom: 20px;
+                            }}
+                            .section {{ 
+                                margin: 20px 0; 
+                                padding: 15px;
+                                border-left: 4px solid #A23B72;
+                                background-color: #f9f9f9;
+                            }}
+                            .section-title {{ 
+                                color: #A23B72; 
+                                font-size: 18px; 
+                                font-weight: bold; 
+                                margin-bottom: 10px; 
+                            }}
+                            .selections {{
+                                background-color: #e8f4f8;
+                                padding: 15px;
+                                border-radius: 5px;
+                                margin: 10px 0;
+                            }}
+                        </style>
+                    </head>
+                    <body>
+                        <div class="header">
+                            <h1>🌍 Travel Itinerary: {trip_data['destination']}</h1>
+                            <p><strong>Duration:</strong> {trip_data['num_days']} days | <strong>Budget:</strong> ₹{trip_data['budget']} INR | <strong>Language:</strong> {trip_data['language']}</p>
+                            <p><strong>Generated:</strong> {trip['date']}</p>
+                        </div>
+                        
+                        <div class="section">
+                            <div class="section-title">🔍 Research Results</div>
+                            <div>{research_results.replace(chr(10), '<br/>')}</div>
+                        </div>
+                        
+                        <div class="section">
+                            <div class="section-title">✨ Your Selections</div>
+                            <div class="selections">
+                                <p><strong>🏨 Accommodation:</strong> {selected_accommodation} ({accommodation_pref})</p>
+                                <p><strong>🎯 Activities:</strong> {', '.join(selected_activities)} ({activity_pref})</p>
+                                <p><strong>🍽️ Dining:</strong> {', '.join(selected_dining)} ({dining_pref})</p>
+                                <p><strong>🚗 Transportation:</strong> {selected_transport} ({transport_pref})</p>
+                                {f'<p><strong>💭 Special Requests:</strong> {special_requests}</p>' if special_requests else ''}
+                            </div>
+                        </div>
+                        
+                        <div class="section">
+                            <div class="section-title">🗓️ Detailed Itinerary</div>
+                            <div>{itinerary_text.replace(chr(10), '<br/>')}</div>
+                        </div>
+                    </body>
+                    </html>
+                    """
+                    
+                    # Try multiple PDF generation methods
+                    pdf_generated = False
+                    pdf_filename = f"itinerary_{trip_data['destination'].replace(' ', '_')}_{export_trip_id}.pdf"
+                    
+                    # Method 1: Try weasyprint first (most reliable)
+                    try:
+                        from weasyprint import HTML
+                        HTML(string=html_content).write_pdf(pdf_filename)
+                        pdf_generated = True
+                        st.info("✅ PDF generated using WeasyPrint")
+                        
+                    except Exception as weasy_error:
+                        # Method 2: Try reportlab as fallback
+                        try:
+                            from reportlab.lib.pagesizes import letter
+                            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+                            from reportlab.lib.styles import getSampleStyleSheet
+                            from reportlab.lib.units import inch
+                            
+                            doc = SimpleDocTemplate(pdf_filename, pagesize=letter)
+                            styles = getSampleStyleSheet()
+                            story = []
+                            
+                            # Add content using reportlab
+                            title = Paragraph(f"Travel Itinerary: {trip_data['destination']}", styles['Title'])
+                            story.append(title)
+                            story.append(Spacer(1, 12))
+                            
+                            # Trip details
+                            details = f"Duration: {trip_data['num_days']} days | Budget: ₹{trip_data['budget']} INR | Language: {trip_data['language']}"
+                            details_para = Paragraph(details, styles['Normal'])
+                            story.append(details_para)
+                            story.append(Spacer(1, 12))
+                            
+                            # Research section
+                            research_title = Paragraph("Research Results", styles['Heading2'])
+                            story.append(research_title)
+                            research_para = Paragraph(research_results[:1000].replace('<', '&lt;').replace('>', '&gt;'), styles['Normal'])
+                            story.append(research_para)
+                            story.append(Spacer(1, 12))
+                            
+                            # Selections section
+                            selections_title = Paragraph("Your Selections", styles['Heading2'])
+                            story.append(selections_title)
+                            selections_text = f"Accommodation: {selected_accommodation} | Activities: {', '.join(selected_activities)[:100]} | Dining: {', '.join(selected_dining)[:100]} | Transportation: {selected_transport}"
+                            selections_para = Paragraph(selections_text.replace('<', '&lt;').replace('>', '&gt;'), styles['Normal'])
+                            story.append(selections_para)
+                            story.append(Spacer(1, 12))
+                            
+                            # Itinerary section
+                            itinerary_title = Paragraph("Detailed Itinerary", styles['Heading2'])
+                            story.append(itinerary_title)
+                            itinerary_para = Paragraph(itinerary_text[:2000].replace('<', '&lt;').replace('>', '&gt;'), styles['Normal'])
+                            story.append(itinerary_para)
+                            
+                            doc.build(story)
+                            pdf_generated = True
+                            st.info("✅ PDF generated using ReportLab")
+                            
+                        except Exception as reportlab_error:
+                            st.error(f"❌ All PDF generation methods failed. Error: {str(reportlab_error)}")
+                    
+                    if pdf_generated:
+                        with open(pdf_filename, "rb") as f:
+                            pdf_data = f.read()
+                            st.download_button(
+                                "📥 Download PDF", 
+                                pdf_data, 
+                                file_name=pdf_filename, 
+                                mime="application/pdf",
+                                key=f"pdf_download_{export_trip_id}"
+                            )
+                        
+                        # Clean up
+                        try:
+                            os.remove(pdf_filename)
+                        except:
+                            pass
+                        st.success("✅ PDF ready for download!")
+                    else:
+                        # Fallback: offer text download
+                        formatted_content = f"""
+=== TRAVEL ITINERARY ===
+Destination: {trip_data['destination']}
+Duration: {trip_data['num_days']} days
+Budget: ₹{trip_data['budget']} INR
+Language: {trip_data['language']}
+Generated: {trip['date']}
+
+=== RESEARCH RESULTS ===
+{research_results}
+
+=== YOUR SELECTIONS ===
+🏨 Accommodation: {selected_accommodation} ({accommodation_pref})
+🎯 Activities: {', '.join(selected_activities)} ({activity_pref})
+🍽️ Dining: {', '.join(selected_dining)} ({dining_pref})
+🚗 Transportation: {selected_transport} ({transport_pref})
+{f'💭 Special Requests: {special_requests}' if special_requests else ''}
+
+=== DETAILED ITINERARY ===
+{itinerary_text}
+"""
+                        st.warning("⚠️ PDF generation unavailable. Offering text download instead.")
+                        st.download_button(
+                            "📄 Download as Text File", 
+                            formatted_content, 
+                            file_name=f"itinerary_{trip_data['destination'].replace(' ', '_')}_{export_trip_id}.txt", 
+                            mime="text/plain",
+                            key=f"fallback_text_download_{export_trip_id}"
+                        )
+                    
+                except Exception as pdf_error:
+                    st.error(f"❌ Export failed: {str(pdf_error)}")
+    
+    with col2:
+        # Calendar Export
+        if st.button("📅 Download Calendar (.ics)", type="secondary"):
+            export_trip_id = str(uuid.uuid4())[:8]
+            with st.spinner("📅 Generating Calendar..."):
+                try:
+                    from ics import Calendar, Event
+                    
+                    cal = Calendar()
+                    start_date = datetime.now().date()
+                    
+                    # Create calendar events for each day
+                    for i in range(trip_data['num_days']):
+                        e = Event()
+                        e.name = f"🌍 {trip_data['destination']} Trip - Day {i+1}"
+                        e.begin = start_date + timedelta(days=i)
+                        e.description = f"Day {i+1} of your {trip_data['destination']} trip\\n\\nBudget: ₹{trip_data['budget']} INR\\n\\nSelected Options:\\n- Accommodation: {selected_accommodation}\\n- Activities: {', '.join(selected_activities)}\\n- Dining: {', '.join(selected_dining)}\\n- Transport: {selected_transport}\\n\\nItinerary:\\n{itinerary_text[:300]}..."
+                        e.duration = timedelta(hours=8)  # 8-hour events
+                        cal.events.add(e)
+                    
+                    ics_filename = f"trip_{trip_data['destination'].replace(' ', '_')}_{export_trip_id}.ics"
+                    ics_content = str(cal)
+                    
+                    st.download_button(
+                        "📥 Download Calendar", 
+                        ics_content, 
+                        file_name=ics_filename, 
+                        mime="text/calendar",
+                        key=f"calendar_download_{export_trip_id}"
+                    )
+                    st.success("✅ Calendar file ready for download!")
+                    
+                except Exception as e:
+                    st.error(f"❌ Error creating calendar: {str(e)}")
+                    st.info("💡 Installing required packages...")
+                    # Attempt to install ics package
+                    try:
+                        import subprocess
+                        subprocess.check_call(["pip", "install", "ics"])
+                        st.info("📦 ics package installed. Please try again.")
+                    except:
+                        st.warning("⚠️ Could not auto-install calendar dependencies. You may need to install the 'ics' package manually.")
+
+
+@timed_fragment("map")
+def map_section(trip_data):
+    """Destination map; clicking or panning it reruns only this section"""
+    st.subheader("🗺️ Interactive Destination Map")
+    
+    if not MAP_AVAILABLE:
+        st.warning("⚠️ Interactive maps are not available. The required mapping libraries are not installed.")
+        st.info(f"📍 Your destination: {trip_data['destination']}")
+        st.info("🗺️ You can search for this destination on Google Maps for detailed location information.")
+    else:
+        # Simplified geocoding approach
+        def locate(destination_name):
+            """Get coordinates using a simple mapping approach with AI fallback"""
             
-            Generate 3 search terms related to the destination and days.
-            For each, use `search_google` to fetch results and analyze.
-            Return 10 most relevant insights aligned with user's preferences.
-            Maintain high quality and relevance.
+            dest_lower = destination_name.lower()
+            for key, coords in LOCATION_COORDS.items():
+                if key in dest_lower:
+                    return coords
             
-            Present your findings in this format:
+            # AI fallback for unknown destinations
+            try:
+                geocode_llm = get_llm()
+                
+                geocode_prompt = f"""
+                What are the latitude and longitude coordinates for {destination_name}?
+                Respond ONLY with: latitude,longitude
+                Example: 28.6139,77.2090
+                """
+                
+                response = get_call_policy("geocode").call(geocode_llm.invoke, geocode_prompt)
+                coords_text = response.content.strip()
+                
+                if ',' in coords_text:
+                    lat_str, lon_str = coords_text.split(',')
+                    return float(lat_str.strip()), float(lon_str.strip())
+            except Exception:
+                pass
+            return None
+
+        def get_coordinates(destination_name):
+            """Locate each destination once per session, so map interactions never repeat the LLM fallback"""
+            coordinates = st.session_state.setdefault("destination_coordinates", {})
+            if destination_name not in coordinates:
+                located = locate(destination_name)
+                if located is None:
+                    # Not remembered, so the next draw of the map tries again
+                    return None
+                coordinates[destination_name] = located
+            return coordinates[destination_name]
+        
+        with st.spinner("🌍 Locating destination on map..."):
+            located = get_coordinates(trip_data['destination'])
+        # Default fallback to India center
+        lat, lon = located or (20.5937, 78.9629)
+
+        try:
+            if located is None:
+                st.warning(f"📍 Couldn't locate {trip_data['destination']}; showing the centre of India instead.")
+            else:
+                st.success(f"📍 Located: {trip_data['destination']} at {lat:.4f}, {lon:.4f}")
+                
+            # Create and display map
+            import folium
+            from streamlit_folium import st_folium
             
-            **ACCOMMODATIONS OPTIONS:**
-            - Option 1: [Name] - [Brief description] - [Price range in INR within ₹{budget} total budget]
-            - Option 2: [Name] - [Brief description] - [Price range in INR within ₹{budget} total budget]
-            - Option 3: [Name] - [Brief description] - [Price range in INR within ₹{budget} total budget]
+            map_obj = folium.Map(
+                location=[lat, lon], 
+                zoom_start=8,
+                tiles='OpenStreetMap'
+            )
             
-            **ACTIVITY OPTIONS:**
-            - Option 1: [Activity] - [Description] - [Duration/Time needed] - [Cost in INR]
-            - Option 2: [Activity] - [Description] - [Duration/Time needed] - [Cost in INR]
-            - Option 3: [Activity] - [Description] - [Duration/Time needed] - [Cost in INR]
+            # Add destination marker
+            folium.Marker(
+                [lat, lon], 
+                popup=f"🎯 {trip_data['destination']}",
+                tooltip=f"📍 {trip_data['destination']} - Your destination!",
+                icon=folium.Icon(color='red', icon='star')
+            ).add_to(map_obj)
             
-            **DINING OPTIONS:**
-            - Option 1: [Restaurant/Food] - [Cuisine type] - [Price range in INR]
-            - Option 2: [Restaurant/Food] - [Cuisine type] - [Price range in INR]
-            - Option 3: [Restaurant/Food] - [Cuisine type] - [Price range in INR]
+            # Display map
+            map_data = st_folium(map_obj, width=700, height=400, returned_objects=["last_object_clicked"])
+            st.caption(f"📍 Showing location of {trip_data['destination']}")
             
-            The user has a total budget of ₹{budget} INR for {num_days} days and prefers information in {language}.
-            REMEMBER: Write ALL content in {language}, not English or any other language.
-            """
-        )
-        researcher_instructions = [
-            "Generate 3 search terms related to the destination and days.",
-            "For each, use `search_google` to fetch results and analyze.",
-            "Return 10 most relevant insights aligned with user's preferences.",
-            "Maintain high quality and relevance.",
-        ]
-
-        planner_prompt = dedent(
-            f"""
-            You are a senior travel planner. Given destination, number of days, budget, preferred language,
-            and a list of research results, create a draft itinerary.
-            Include activities, accommodation suggestions, and food recommendations.
-            Ensure clarity, coherence, and quality.
-            """
-        )
-        planner_instructions = [
-            "Generate a detailed day-wise itinerary.",
-            "Quote facts from research results, do not fabricate.",
-            "Make it engaging and tailored to user's budget and language.",
-        ]
-
-        # Setup researcher agent with search tool
-        researcher = initialize_agent(
-            tools=[search_tool],
-            llm=llm,
-            agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            verbose=False,
-            memory=memory,
-            max_iterations=3,
-            handle_parsing_errors=True,
-        )
-
-        with st.spinner("🔍 Researching your destination..."):
-            research_input = (
-                researcher_prompt
-                + f"\nDestination: {destination}\nDays: {num_days}\nBudget: {budget}\nLanguage: {language}"
-            )
-            research_results = researcher.invoke({"input": research_input})["output"]
+        except Exception as e:
+            st.warning(f"⚠️ Map display error: {str(e)}")
+            st.info(f"📍 Your destination: {trip_data['destination']}")
+            st.info(f"🗺️ Coordinates: {lat:.4f}, {lon:.4f}")
             
-            # Store research results and trip data in session state
-            st.session_state.research_results = research_results
-            st.session_state.current_trip_data = {
-                "destination": destination,
-                "num_days": num_days,
-                "budget": budget,
-                "language": language
-            }
-            st.session_state.show_preferences = True
+            # Fallback: show a simple text-based location info
+            st.markdown(f"""
+            **📍 Location Information:**
+            - **Destination:** {trip_data['destination']}
+            - **Coordinates:** {lat:.4f}, {lon:.4f}
+            - You can search for "{trip_data['destination']}" on Google Maps for detailed location information.
+            """)
 
-        st.success("✓ Research completed! Now select your preferences below.")
-        st.rerun()
 
 # Show research results and preference selection if research is completed
 if st.session_state.show_preferences and st.session_state.research_results is not None:
@@ -182,6 +750,15 @@ if st.session_state.show_preferences and st.session_state.research_results is no
     st.subheader("🎯 Select Your Preferences")
     st.markdown("Choose your preferred options based on the research results above:")
     
+    # Recommendation prompts are collected per section and issued together once all sections are laid out
+    llm = get_llm()
+    pending_recommendations = {}
+    
+    # Each preference prompt only gets its own section of the research, within a token budget
+    research_slices, research_tokens_saved, planner_research = research_for_prompts(
+        st.session_state.research_results, ["accommodation", "activity", "dining", "transport"]
+    )
+    
     # Accommodation Selection with box-based input
     st.markdown("### 🏨 **Accommodation Preference**")
     accommodation_options = [
@@ -205,7 +782,7 @@ if st.session_state.show_preferences and st.session_state.research_results is no
     accommodation_pref = st.selectbox(
         "Select your accommodation style:",
         accommodation_options,
-        index=1,
+        index=accommodation_options.index(DEFAULT_PREFERENCES["accommodation"]),
         help="Choose based on your budget and comfort preferences"
     )
     st.info(f"ℹ️ {accommodation_descriptions[accommodation_pref]}")
@@ -213,56 +790,15 @@ if st.session_state.show_preferences and st.session_state.research_results is no
     # Show specific accommodation recommendations based on selection
     if accommodation_pref != "No Preference":
         st.markdown("#### 🏨 **Top Accommodation Recommendations for Your Selection:**")
+        accommodation_placeholder = st.empty()
+        accommodation_placeholder.info("🔍 Finding specific accommodation options...")
         
-        with st.spinner("🔍 Finding specific accommodation options..."):
-            # Use LLM to get specific recommendations based on research and preference
-            llm = ChatOpenAI(
-                model="gpt-4o-mini",
-                openai_api_key=github_token,
-                openai_api_base="https://models.inference.ai.azure.com"
-            )
-            
-            accommodation_search_prompt = f"""
-            IMPORTANT: Respond ONLY in {trip_data['language']} language. All responses must be in {trip_data['language']}.
-            
-            Based on the research results and user preference for {accommodation_pref} in {trip_data['destination']}, 
-            provide exactly 3 specific accommodation recommendations in this format:
-            
-            **Option 1: [Hotel Name]**
-            - Description: [Brief description and key features]
-            - Price: ₹[amount] per night
-            - Location: [area/location]
-            - Why recommended: [reason it fits preference]
-            
-            **Option 2: [Hotel Name]**
-            - Description: [Brief description and key features]  
-            - Price: ₹[amount] per night
-            - Location: [area/location]
-            - Why recommended: [reason it fits preference]
-            
-            **Option 3: [Hotel Name]**
-            - Description: [Brief description and key features]
-            - Price: ₹[amount] per night  
-            - Location: [area/location]
-            - Why recommended: [reason it fits preference]
-            
-            Research context: {st.session_state.research_results}
-            Budget: ₹{trip_data['budget']} INR total for {trip_data['num_days']} days
-            """
-            
-            accommodation_recommendations = llm.invoke(accommodation_search_prompt).content
-            st.write(accommodation_recommendations)
-            
-        # Allow user to select their preferred accommodation option
+        accommodation_search_prompt = recommendation_prompt(trip_data, "accommodation", accommodation_pref, research_slices["accommodation"])
+        
+        # Allow user to select their preferred accommodation option once its recommendations are loaded
         st.markdown("##### Choose your preferred accommodation:")
-        selected_accommodation = st.selectbox(
-            "Select your accommodation:",
-            ["Option 1", "Option 2", "Option 3", "Let AI decide based on budget"],
-            key="accommodation_selection",
-            help="Choose the accommodation option that best fits your preferences"
-        )
-    else:
-        selected_accommodation = "No Preference"
+        accommodation_choice_slot = st.empty()
+        pending_recommendations["accommodation"] = (accommodation_placeholder, accommodation_choice_slot, accommodation_search_prompt)
     
     # Activity Selection with box-based input
     st.markdown("### 🎯 **Activity Preference**")
@@ -287,7 +823,7 @@ if st.session_state.show_preferences and st.session_state.research_results is no
     activity_pref = st.selectbox(
         "Choose your activity focus:",
         activity_options,
-        index=5,
+        index=activity_options.index(DEFAULT_PREFERENCES["activity"]),
         help="Select the type of activities you're most interested in"
     )
     st.info(f"ℹ️ {activity_descriptions[activity_pref]}")
@@ -295,51 +831,15 @@ if st.session_state.show_preferences and st.session_state.research_results is no
     # Show specific activity recommendations
     if activity_pref != "Mix of Everything":
         st.markdown("#### 🎯 **Top Activity Recommendations for Your Selection:**")
+        activity_placeholder = st.empty()
+        activity_placeholder.info("🔍 Finding specific activity options...")
         
-        with st.spinner("🔍 Finding specific activity options..."):
-            activity_search_prompt = f"""
-            IMPORTANT: Respond ONLY in {trip_data['language']} language. All responses must be in {trip_data['language']}.
-            
-            Based on the research results and user preference for {activity_pref} in {trip_data['destination']}, 
-            provide exactly 3 specific activity recommendations in this format:
-            
-            **Option 1: [Activity Name]**
-            - Description: [What to expect and details]
-            - Cost: ₹[amount] per person
-            - Duration: [time needed]
-            - Why recommended: [reason it fits preference]
-            
-            **Option 2: [Activity Name]**  
-            - Description: [What to expect and details]
-            - Cost: ₹[amount] per person
-            - Duration: [time needed]
-            - Why recommended: [reason it fits preference]
-            
-            **Option 3: [Activity Name]**
-            - Description: [What to expect and details]
-            - Cost: ₹[amount] per person
-            - Duration: [time needed]
-            - Why recommended: [reason it fits preference]
-            
-            Research context: {st.session_state.research_results}
-            Budget: ₹{trip_data['budget']} INR total for {trip_data['num_days']} days
-            """
-            
-            activity_recommendations = llm.invoke(activity_search_prompt).content
-            st.write(activity_recommendations)
-            
-        # Allow user to select their preferred activity options
+        activity_search_prompt = recommendation_prompt(trip_data, "activity", activity_pref, research_slices["activity"])
+        
+        # Allow user to select their preferred activity options once its recommendations are loaded
         st.markdown("##### Choose your preferred activities:")
-        selected_activities = st.multiselect(
-            "Select activities you want to include (you can choose multiple):",
-            ["Option 1", "Option 2", "Option 3"],
-            key="activity_selection",
-            help="Choose one or more activities for your itinerary"
-        )
-        if not selected_activities:  # If no activities selected, provide default
-            selected_activities = ["Option 1"]  # Default selection
-    else:
-        selected_activities = ["Mix of Everything"]
+        activity_choice_slot = st.empty()
+        pending_recommendations["activity"] = (activity_placeholder, activity_choice_slot, activity_search_prompt)
     
     # Dining Selection with box-based input
     st.markdown("### 🍽️ **Dining Preference**")
@@ -364,7 +864,7 @@ if st.session_state.show_preferences and st.session_state.research_results is no
     dining_pref = st.selectbox(
         "Choose your dining style:",
         dining_options,
-        index=2,
+        index=dining_options.index(DEFAULT_PREFERENCES["dining"]),
         help="Select your preferred dining experience and budget range"
     )
     st.info(f"ℹ️ {dining_descriptions[dining_pref]}")
@@ -372,54 +872,15 @@ if st.session_state.show_preferences and st.session_state.research_results is no
     # Show specific dining recommendations
     if dining_pref != "No Preference":
         st.markdown("#### 🍽️ **Top Dining Recommendations for Your Selection:**")
+        dining_placeholder = st.empty()
+        dining_placeholder.info("🔍 Finding specific dining options...")
         
-        with st.spinner("🔍 Finding specific dining options..."):
-            dining_search_prompt = f"""
-            IMPORTANT: Respond ONLY in {trip_data['language']} language. All responses must be in {trip_data['language']}.
-            
-            Based on the research results and user preference for {dining_pref} in {trip_data['destination']}, 
-            provide exactly 3 specific restaurant/dining recommendations in this format:
-            
-            **Option 1: [Restaurant Name]**
-            - Cuisine: [Type of cuisine]
-            - Specialties: [Signature dishes]
-            - Cost: ₹[amount] per person per meal
-            - Location: [area/address]
-            - Why recommended: [reason it fits preference]
-            
-            **Option 2: [Restaurant Name]**
-            - Cuisine: [Type of cuisine]  
-            - Specialties: [Signature dishes]
-            - Cost: ₹[amount] per person per meal
-            - Location: [area/address]
-            - Why recommended: [reason it fits preference]
-            
-            **Option 3: [Restaurant Name]**
-            - Cuisine: [Type of cuisine]
-            - Specialties: [Signature dishes] 
-            - Cost: ₹[amount] per person per meal
-            - Location: [area/address]
-            - Why recommended: [reason it fits preference]
-            
-            Research context: {st.session_state.research_results}
-            Budget: ₹{trip_data['budget']} INR total for {trip_data['num_days']} days
-            """
-            
-            dining_recommendations = llm.invoke(dining_search_prompt).content
-            st.write(dining_recommendations)
-            
-        # Allow user to select their preferred dining options
+        dining_search_prompt = recommendation_prompt(trip_data, "dining", dining_pref, research_slices["dining"])
+        
+        # Allow user to select their preferred dining options once its recommendations are loaded
         st.markdown("##### Choose your preferred dining options:")
-        selected_dining = st.multiselect(
-            "Select restaurants you want to include (you can choose multiple):",
-            ["Option 1", "Option 2", "Option 3"],
-            key="dining_selection",
-            help="Choose one or more dining options for your itinerary"
-        )
-        if not selected_dining:  # If no dining selected, provide default
-            selected_dining = ["Option 1"]  # Default selection
-    else:
-        selected_dining = ["No Preference"]
+        dining_choice_slot = st.empty()
+        pending_recommendations["dining"] = (dining_placeholder, dining_choice_slot, dining_search_prompt)
     
     # Transportation Selection with box-based input
     st.markdown("### 🚗 **Transportation Preference**")
@@ -444,7 +905,7 @@ if st.session_state.show_preferences and st.session_state.research_results is no
     transport_pref = st.selectbox(
         "Choose your transportation style:",
         transport_options,
-        index=0,
+        index=transport_options.index(DEFAULT_PREFERENCES["transport"]),
         help="Select how you prefer to get around during your trip"
     )
     st.info(f"ℹ️ {transport_descriptions[transport_pref]}")
@@ -452,47 +913,127 @@ if st.session_state.show_preferences and st.session_state.research_results is no
     # Show specific transportation recommendations
     if transport_pref != "No Preference":
         st.markdown("#### 🚗 **Transportation Recommendations for Your Selection:**")
+        transport_placeholder = st.empty()
+        transport_placeholder.info("🔍 Finding specific transportation options...")
         
-        with st.spinner("🔍 Finding specific transportation options..."):
-            transport_search_prompt = f"""
-            IMPORTANT: Respond ONLY in {trip_data['language']} language. All responses must be in {trip_data['language']}.
-            
-            Based on the research results and user preference for {transport_pref} in {trip_data['destination']}, 
-            provide exactly 3 specific transportation recommendations in this format:
-            
-            **Option 1: [Service Name/Type]**
-            - Description: [Service details and availability]
-            - Cost: ₹[amount] per day/trip
-            - Coverage: [Areas served and convenience]
-            - Booking: [How to book and tips]
-            - Why recommended: [reason it fits preference]
-            
-            **Option 2: [Service Name/Type]**
-            - Description: [Service details and availability]
-            - Cost: ₹[amount] per day/trip  
-            - Coverage: [Areas served and convenience]
-            - Booking: [How to book and tips]
-            - Why recommended: [reason it fits preference]
-            
-            **Option 3: [Service Name/Type]**
-            - Description: [Service details and availability]
-            - Cost: ₹[amount] per day/trip
-            - Coverage: [Areas served and convenience] 
-            - Booking: [How to book and tips]
-            - Why recommended: [reason it fits preference]
-            
-            Research context: {st.session_state.research_results}
-            Budget: ₹{trip_data['budget']} INR total for {trip_data['num_days']} days
-            """
-            
-            transport_recommendations = llm.invoke(transport_search_prompt).content
-            st.write(transport_recommendations)
-            
-        # Allow user to select their preferred transportation
+        transport_search_prompt = recommendation_prompt(trip_data, "transport", transport_pref, research_slices["transport"])
+        
+        # Allow user to select their preferred transportation once its recommendations are loaded
         st.markdown("##### Choose your preferred transportation:")
-        selected_transport = st.selectbox(
+        transport_choice_slot = st.empty()
+        pending_recommendations["transport"] = (transport_placeholder, transport_choice_slot, transport_search_prompt)
+    
+    # Recommendations are kept per category and only requested again when their prompt changes, so picking
+    # options, ticking a multiselect or typing special requests reruns the page without any LLM calls
+    recommendation_mode = os.getenv("RECOMMENDATION_MODE", "fanout")
+    recommendation_format = os.getenv("RECOMMENDATION_FORMAT", "structured")
+    recommendation_state = st.session_state.setdefault("recommendations", {})
+    recommendation_keys = {
+        category: make_cache_key(f"{recommendation_mode}:{recommendation_format}", prompt)
+        for category, (_, _, prompt) in pending_recommendations.items()
+    }
+    stale_recommendations = {
+        category: prompt
+        for category, (_, _, prompt) in pending_recommendations.items()
+        if recommendation_state.get(category, {}).get("key") != recommendation_keys[category]
+    }
+    
+    # Fetch the changed recommendation categories concurrently and render each as it completes
+    recommendation_choices = {}
+    if stale_recommendations:
+        fan_out_start = time.perf_counter()
+        recommendation_prompts = stale_recommendations
+        st.session_state.last_prompt_prefix = shared_prefix(list(recommendation_prompts.values()))
+        recommendation_usage = {}
+        preferences = {
+            "accommodation": accommodation_pref,
+            "activity": activity_pref,
+            "dining": dining_pref,
+            "transport": transport_pref,
+        }
+        recommendation_results = run_recommendations(
+            response_cache,
+            llm,
+            trip_data,
+            {category: preferences[category] for category in recommendation_prompts},
+            recommendation_prompts,
+            research_slices,
+            st.session_state.research_results,
+            policy=get_call_policy("recommendation"),
+            usage=recommendation_usage,
+        )
+        for category, content, error in recommendation_results:
+            # Failures are not kept, so the next rerun tries that category again
+            if error is None:
+                recommendation_state[category] = {"key": recommendation_keys[category], "content": content}
+                placeholder = pending_recommendations[category][0]
+                if isinstance(content, RecommendationOptions):
+                    placeholder.markdown(format_options_markdown(content))
+                else:
+                    placeholder.write(content)
+            else:
+                recommendation_state.pop(category, None)
+                pending_recommendations[category][0].error(f"❌ Could not load {category} recommendations: {str(error)}")
+        st.session_state.last_fan_out_seconds = time.perf_counter() - fan_out_start
+        st.session_state.last_recommendation_run = dict(recommendation_usage, mode=recommendation_mode)
+        st.session_state.last_research_tokens_saved = sum(
+            research_tokens_saved[category] for category in recommendation_prompts
+        )
+    
+    for category, (placeholder, _, _) in pending_recommendations.items():
+        if category in stale_recommendations:
+            content = recommendation_state.get(category, {}).get("content")
+        else:
+            content = recommendation_state[category]["content"]
+            if isinstance(content, RecommendationOptions):
+                placeholder.markdown(format_options_markdown(content))
+            else:
+                placeholder.write(content)
+        if isinstance(content, RecommendationOptions):
+            recommendation_choices[category] = [option.label() for option in content.options]
+    
+    # Selection widgets offer the structured records directly, or generic option numbers for markdown answers
+    default_choices = ["Option 1", "Option 2", "Option 3"]
+    if "accommodation" in pending_recommendations:
+        selected_accommodation = pending_recommendations["accommodation"][1].selectbox(
+            "Select your accommodation:",
+            recommendation_choices.get("accommodation", default_choices) + ["Let AI decide based on budget"],
+            key="accommodation_selection",
+            help="Choose the accommodation option that best fits your preferences"
+        )
+    else:
+        selected_accommodation = "No Preference"
+    
+    if "activity" in pending_recommendations:
+        activity_choices = recommendation_choices.get("activity", default_choices)
+        selected_activities = pending_recommendations["activity"][1].multiselect(
+            "Select activities you want to include (you can choose multiple):",
+            activity_choices,
+            key="activity_selection",
+            help="Choose one or more activities for your itinerary"
+        )
+        if not selected_activities:  # If no activities selected, provide default
+            selected_activities = activity_choices[:1]  # Default selection
+    else:
+        selected_activities = ["Mix of Everything"]
+    
+    if "dining" in pending_recommendations:
+        dining_choices = recommendation_choices.get("dining", default_choices)
+        selected_dining = pending_recommendations["dining"][1].multiselect(
+            "Select restaurants you want to include (you can choose multiple):",
+            dining_choices,
+            key="dining_selection",
+            help="Choose one or more dining options for your itinerary"
+        )
+        if not selected_dining:  # If no dining selected, provide default
+            selected_dining = dining_choices[:1]  # Default selection
+    else:
+        selected_dining = ["No Preference"]
+    
+    if "transport" in pending_recommendations:
+        selected_transport = pending_recommendations["transport"][1].selectbox(
             "Select your transportation method:",
-            ["Option 1", "Option 2", "Option 3", "Combination of options"],
+            recommendation_choices.get("transport", default_choices) + ["Combination of options"],
             key="transport_selection",
             help="Choose the transportation method that works best for your trip"
         )
@@ -510,28 +1051,17 @@ if st.session_state.show_preferences and st.session_state.research_results is no
     
     # Generate final itinerary button
     if st.button("🎯 Generate My Personalized Itinerary", type="primary"):
-        with st.spinner("🎯 Creating your personalized itinerary based on your preferences..."):
-            # Use GitHub Models - Planner Agent
-            planner_llm = ChatOpenAI(
-                model="gpt-4o-mini",
-                openai_api_key=github_token,
-                openai_api_base="https://models.inference.ai.azure.com"
-            )
-            
-            planner_input = f"""
-CRITICAL: Respond ONLY in {trip_data['language']} language. Every word of the itinerary must be in {trip_data['language']}.
-
+        # Use GitHub Models - Planner Agent
+        planner_llm = get_llm()
+        
+        st.session_state.last_planner_tokens_saved = (
+            count_tokens(st.session_state.research_results) - count_tokens(planner_research)
+        )
+        
+        planner_input = build_prompt(trip_data, planner_research, f"""
 You are a senior travel planner. Based on the research results and user preferences, create a detailed day-wise itinerary.
 Follow the planner instructions: Generate a detailed day-wise itinerary, quote facts from research results (do not fabricate), make it engaging and tailored to user's budget and language.
 
-DESTINATION: {trip_data['destination']}
-DURATION: {trip_data['num_days']} days
-BUDGET: ₹{trip_data['budget']} INR total
-LANGUAGE: {trip_data['language']} - IMPORTANT: Use this language for ALL content
-
-RESEARCH RESULTS:
-{st.session_state.research_results}
-
 USER PREFERENCES AND SPECIFIC SELECTIONS:
 - Accommodation Preference: {accommodation_pref}
 - Selected Accommodation: {selected_accommodation}
@@ -556,24 +1086,14 @@ Format the response clearly with day headers and detailed activities. Ensure all
 
 IMPORTANT: Structure the itinerary to specifically include the user's selected options rather than generic suggestions.
 REMEMBER: Write EVERYTHING in {trip_data['language']}, not English or any other language.
-"""
-            
-            itinerary_response = planner_llm.invoke(planner_input)
-            itinerary_text = itinerary_response.content
-            
-        st.success("✅ Your personalized itinerary is ready!")
-        st.subheader("🗓️ Your Complete Travel Itinerary")
-        st.write(itinerary_text)
-
-        # Save to session with all data including preferences and specific selections
-        trip_id = str(uuid.uuid4())[:8]
-        st.session_state.trip_history.append({
-            "id": trip_id,
-            "destination": trip_data['destination'],
-            "days": trip_data['num_days'],
-            "budget": trip_data['budget'],
-            "language": trip_data['language'],
-            "itinerary": itinerary_text,
+""")
+        st.session_state.last_prompt_prefix = shared_prefix(
+            [planner_input] + [prompt for _, _, prompt in pending_recommendations.values()]
+        )
+        
+        # The planner runs in the background, so a rerun or refresh while it writes loses nothing
+        start_job("planner", run_planner_job, planner_llm, planner_input, meta={
+            "trip_data": trip_data,
             "research": st.session_state.research_results,
             "preferences": {
                 "accommodation": accommodation_pref,
@@ -586,367 +1106,139 @@ REMEMBER: Write EVERYTHING in {trip_data['language']}, not English or any other
                 "selected_transport": selected_transport,
                 "special_requests": special_requests
             },
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
         })
 
-        # Export Options - PDF and Calendar Only
-        st.subheader("📥 Export Your Itinerary")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # PDF Export with multiple fallback methods
-            if st.button("📄 Generate PDF", type="primary"):
-                export_trip_id = str(uuid.uuid4())[:8]
-                with st.spinner("📄 Generating PDF..."):
-                    try:
-                        # Create clean HTML for PDF
-                        html_content = f"""
-                        <!DOCTYPE html>
-                        <html>
-                        <head>
-                            <meta charset="UTF-8">
-                            <title>Travel Itinerary - {trip_data['destination']}</title>
-                            <style>
-                                body {{ 
-                                    font-family: Arial, sans-serif; 
-                                    margin: 20px; 
-                                    line-height: 1.6; 
-                                    color: #333;
-                                }}
-                                .header {{ 
-                                    text-align: center; 
-                                    color: #2E86AB; 
-                                    margin-bottom: 30px; 
-                                    border-bottom: 2px solid #2E86AB;
-                                    padding-bottom: 20px;
-                                }}
-                                .section {{ 
-                                    margin: 20px 0; 
-                                    padding: 15px;
-                                    border-left: 4px solid #A23B72;
-                                    background-color: #f9f9f9;
-                                }}
-                                .section-title {{ 
-                                    color: #A23B72; 
-                                    font-size: 18px; 
-                                    font-weight: bold; 
-                                    margin-bottom: 10px; 
-                                }}
-                                .selections {{
-                                    background-color: #e8f4f8;
-                                    padding: 15px;
-                                    border-radius: 5px;
-                                    margin: 10px 0;
-                                }}
-                            </style>
-                        </head>
-                        <body>
-                            <div class="header">
-                                <h1>🌍 Travel Itinerary: {trip_data['destination']}</h1>
-                                <p><strong>Duration:</strong> {trip_data['num_days']} days | <strong>Budget:</strong> ₹{trip_data['budget']} INR | <strong>Language:</strong> {trip_data['language']}</p>
-                                <p><strong>Generated:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
-                            </div>
-                            
-                            <div class="section">
-                                <div class="section-title">🔍 Research Results</div>
-                                <div>{st.session_state.research_results.replace(chr(10), '<br/>')}</div>
-                            </div>
-                            
-                            <div class="section">
-                                <div class="section-title">✨ Your Selections</div>
-                                <div class="selections">
-                                    <p><strong>🏨 Accommodation:</strong> {selected_accommodation} ({accommodation_pref})</p>
-                                    <p><strong>🎯 Activities:</strong> {', '.join(selected_activities)} ({activity_pref})</p>
-                                    <p><strong>🍽️ Dining:</strong> {', '.join(selected_dining)} ({dining_pref})</p>
-                                    <p><strong>🚗 Transportation:</strong> {selected_transport} ({transport_pref})</p>
-                                    {f'<p><strong>💭 Special Requests:</strong> {special_requests}</p>' if special_requests else ''}
-                                </div>
-                            </div>
-                            
-                            <div class="section">
-                                <div class="section-title">🗓️ Detailed Itinerary</div>
-                                <div>{itinerary_text.replace(chr(10), '<br/>')}</div>
-                            </div>
-                        </body>
-                        </html>
-                        """
-                        
-                        # Try multiple PDF generation methods
-                        pdf_generated = False
-                        pdf_filename = f"itinerary_{trip_data['destination'].replace(' ', '_')}_{export_trip_id}.pdf"
-                        
-                        # Method 1: Try weasyprint first (most reliable)
-                        try:
-                            from weasyprint import HTML
-                            HTML(string=html_content).write_pdf(pdf_filename)
-                            pdf_generated = True
-                            st.info("✅ PDF generated using WeasyPrint")
-                            
-                        except Exception as weasy_error:
-                            # Method 2: Try reportlab as fallback
-                            try:
-                                from reportlab.lib.pagesizes import letter
-                                from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-                                from reportlab.lib.styles import getSampleStyleSheet
-                                from reportlab.lib.units import inch
-                                
-                                doc = SimpleDocTemplate(pdf_filename, pagesize=letter)
-                                styles = getSampleStyleSheet()
-                                story = []
-                                
-                                # Add content using reportlab
-                                title = Paragraph(f"Travel Itinerary: {trip_data['destination']}", styles['Title'])
-                                story.append(title)
-                                story.append(Spacer(1, 12))
-                                
-                                # Trip details
-                                details = f"Duration: {trip_data['num_days']} days | Budget: ₹{trip_data['budget']} INR | Language: {trip_data['language']}"
-                                details_para = Paragraph(details, styles['Normal'])
-                                story.append(details_para)
-                                story.append(Spacer(1, 12))
-                                
-                                # Research section
-                                research_title = Paragraph("Research Results", styles['Heading2'])
-                                story.append(research_title)
-                                research_para = Paragraph(st.session_state.research_results[:1000].replace('<', '&lt;').replace('>', '&gt;'), styles['Normal'])
-                                story.append(research_para)
-                                story.append(Spacer(1, 12))
-                                
-                                # Selections section
-                                selections_title = Paragraph("Your Selections", styles['Heading2'])
-                                story.append(selections_title)
-                                selections_text = f"Accommodation: {selected_accommodation} | Activities: {', '.join(selected_activities)[:100]} | Dining: {', '.join(selected_dining)[:100]} | Transportation: {selected_transport}"
-                                selections_para = Paragraph(selections_text.replace('<', '&lt;').replace('>', '&gt;'), styles['Normal'])
-                                story.append(selections_para)
-                                story.append(Spacer(1, 12))
-                                
-                                # Itinerary section
-                                itinerary_title = Paragraph("Detailed Itinerary", styles['Heading2'])
-                                story.append(itinerary_title)
-                                itinerary_para = Paragraph(itinerary_text[:2000].replace('<', '&lt;').replace('>', '&gt;'), styles['Normal'])
-                                story.append(itinerary_para)
-                                
-                                doc.build(story)
-                                pdf_generated = True
-                                st.info("✅ PDF generated using ReportLab")
-                                
-                            except Exception as reportlab_error:
-                                st.error(f"❌ All PDF generation methods failed. Error: {str(reportlab_error)}")
-                        
-                        if pdf_generated:
-                            with open(pdf_filename, "rb") as f:
-                                pdf_data = f.read()
-                                st.download_button(
-                                    "📥 Download PDF", 
-                                    pdf_data, 
-                                    file_name=pdf_filename, 
-                                    mime="application/pdf",
-                                    key=f"pdf_download_{export_trip_id}"
-                                )
-                            
-                            # Clean up
-                            try:
-                                os.remove(pdf_filename)
-                            except:
-                                pass
-                            st.success("✅ PDF ready for download!")
-                        else:
-                            # Fallback: offer text download
-                            formatted_content = f"""
-=== TRAVEL ITINERARY ===
-Destination: {trip_data['destination']}
-Duration: {trip_data['num_days']} days
-Budget: ₹{trip_data['budget']} INR
-Language: {trip_data['language']}
-Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}
+    if planner_job is not None and planner_job.state == "failed":
+        st.error(f"❌ Planning failed: {planner_job.error}")
+    elif "planner" in st.session_state.jobs:
+        job_progress("planner", "🎯 Creating your personalized itinerary")
 
-=== RESEARCH RESULTS ===
-{st.session_state.research_results}
+    itinerary = st.session_state.get("itineraries", {}).get(itinerary_key(trip_data))
+    if itinerary is not None:
+        if planner_job is not None and planner_job.state == "done":
+            st.success("✅ Your personalized itinerary is ready!")
+        st.subheader("🗓️ Your Complete Travel Itinerary")
+        st.write(itinerary["itinerary"])
+        st.caption(
+            f"⏱️ Generated {itinerary['date']}: first token after {itinerary['timings']['ttft_seconds']:.2f}s, "
+            f"complete after {itinerary['timings']['total_seconds']:.2f}s"
+        )
+        # Export and map rerun as fragments, so using them never re-executes the planner above
+        export_section(trip_data, itinerary)
+        map_section(trip_data)
 
-=== YOUR SELECTIONS ===
-🏨 Accommodation: {selected_accommodation} ({accommodation_pref})
-🎯 Activities: {', '.join(selected_activities)} ({activity_pref})
-🍽️ Dining: {', '.join(selected_dining)} ({dining_pref})
-🚗 Transportation: {selected_transport} ({transport_pref})
-{f'💭 Special Requests: {special_requests}' if special_requests else ''}
+# Cache statistics for the recommendation calls
+with st.sidebar.expander("📊 Performance"):
+    llm_calls = st.session_state.llm_calls
+    st.write(
+        f"Reruns this session: {llm_calls['reruns']} | LLM calls on this rerun: "
+        f"{llm_calls['calls'] - run_start_llm_calls} | LLM calls this session: {llm_calls['calls']}"
+    )
+    cache_stats = response_cache.stats()
+    st.write(f"LLM cache hits: {cache_stats['hits']} | misses: {cache_stats['misses']}")
+    st.write(f"Hit ratio: {cache_stats['hit_ratio']:.0%} | cached entries: {cache_stats['entries']}")
+    search_stats = search_cache.stats()
+    st.write(
+        f"Search cache hits: {search_stats['hits']} | misses: {search_stats['misses']} | "
+        f"hit ratio: {search_stats['hit_ratio']:.0%} | SerpAPI searches saved: {search_stats['hits']}"
+    )
+    if "last_fan_out_seconds" in st.session_state:
+        recommendation_run = st.session_state.get("last_recommendation_run", {})
+        st.write(
+            f"Last recommendations ({recommendation_run.get('mode', 'fanout')}): "
+            f"{st.session_state.last_fan_out_seconds:.2f}s, {recommendation_run.get('requests', 0)} requests, "
+            f"{recommendation_run.get('prompt_tokens', 0)} prompt tokens"
+        )
+        if recommendation_run.get("fallback_categories"):
+            st.write(f"Batched fallback to per-category calls: {', '.join(recommendation_run['fallback_categories'])}")
+    if "last_research_metrics" in st.session_state:
+        research_metrics = st.session_state.last_research_metrics
+        phases = ", ".join(
+            f"{phase} {research_metrics[f'{phase}_seconds']:.2f}s"
+            for phase in ["terms", "search", "synthesis"]
+            if f"{phase}_seconds" in research_metrics
+        )
+        st.write(
+            f"Last research ({research_metrics['mode']}): {research_metrics['total_seconds']:.2f}s"
+            + (f" ({phases})" if phases else "")
+        )
+        if research_metrics["mode"] == "stored":
+            st.write(
+                f"Served from the research store ({research_metrics['source_mode']} run "
+                f"{research_metrics['age_seconds'] / 3600:.1f}h ago)"
+            )
+        if "iterations" in research_metrics:
+            st.write(f"Agent iterations: {research_metrics['iterations']}")
+        if "stop_reason" in research_metrics:
+            st.write(
+                f"Agent stop reason: {research_metrics['stop_reason']} | parse-error retries: "
+                f"{research_metrics['parse_errors']} | wasted iterations: {research_metrics['wasted_iterations']}"
+            )
+        if research_metrics.get("step_prompt_tokens"):
+            st.write(f"Agent prompt tokens per step: {' → '.join(map(str, research_metrics['step_prompt_tokens']))}")
+        if "raw_result_tokens" in research_metrics:
+            snippets = research_metrics["snippets"]
+            st.write(
+                f"Search snippets: {snippets['raw']} raw, {snippets['unique']} unique, {snippets['used']} used; "
+                f"result tokens {research_metrics['raw_result_tokens']} → {research_metrics['result_tokens']}"
+            )
+        elif "result_tokens" in research_metrics:
+            st.write(f"Search result tokens sent to the model: {research_metrics['result_tokens']}")
+    store_stats = research_store.stats()
+    st.write(
+        f"Research store hits: {store_stats['hits']} | misses: {store_stats['misses']} | "
+        f"trips: {store_stats['fingerprints']} | unique results: {store_stats['contents']}"
+    )
+    if "last_prompt_prefix" in st.session_state:
+        prefix_chars, prefix_tokens = st.session_state.last_prompt_prefix
+        st.write(f"Shared prompt prefix on last request: {prefix_tokens} tokens ({prefix_chars} chars)")
+    if "last_research_tokens_saved" in st.session_state:
+        st.write(f"Research tokens saved on last recommendations: {st.session_state.last_research_tokens_saved}")
+    if "last_planner_tokens_saved" in st.session_state:
+        st.write(f"Research tokens saved on last planner prompt: {st.session_state.last_planner_tokens_saved}")
+    if "last_planner_timings" in st.session_state:
+        planner_timings = st.session_state.last_planner_timings
+        st.write(
+            f"Last planner run: first token {planner_timings['ttft_seconds']:.2f}s, "
+            f"total {planner_timings['total_seconds']:.2f}s"
+        )
+    for name, timings in st.session_state.get("fragment_timings", {}).items():
+        last_rerun = f", last {timings['last_fragment_seconds']:.3f}s" if "last_fragment_seconds" in timings else ""
+        st.write(
+            f"{name.title()} section: {timings['fragment']} own reruns{last_rerun} | "
+            f"{timings['full']} full-page runs, last {timings.get('last_full_seconds', 0):.3f}s"
+        )
+    job_stats = job_runner.stats()
+    job_runs = (
+        f", run p50 {job_stats['p50_run_seconds']:.1f}s / p95 {job_stats['p95_run_seconds']:.1f}s"
+        if job_stats["p50_run_seconds"] is not None else ""
+    )
+    st.write(
+        f"Background jobs: {job_stats['running']} running, {job_stats['queued']} queued, "
+        f"{job_stats['done']} awaiting pickup, {job_stats['cancelled']} cancelled{job_runs}"
+    )
+    for kind, stats in all_scheduler_stats().items():
+        waits = (
+            f", wait p50 {stats['p50_wait_seconds']:.2f}s / p95 {stats['p95_wait_seconds']:.2f}s"
+            if stats["p50_wait_seconds"] is not None else ""
+        )
+        st.write(
+            f"{kind.title()} quota: queue depth {stats['depth']} (max {stats['max_depth']}), "
+            f"{stats['granted']} granted{waits}"
+        )
 
-=== DETAILED ITINERARY ===
-{itinerary_text}
-"""
-                            st.warning("⚠️ PDF generation unavailable. Offering text download instead.")
-                            st.download_button(
-                                "📄 Download as Text File", 
-                                formatted_content, 
-                                file_name=f"itinerary_{trip_data['destination'].replace(' ', '_')}_{export_trip_id}.txt", 
-                                mime="text/plain",
-                                key=f"fallback_text_download_{export_trip_id}"
-                            )
-                        
-                    except Exception as pdf_error:
-                        st.error(f"❌ Export failed: {str(pdf_error)}")
-        
-        with col2:
-            # Calendar Export
-            if st.button("📅 Download Calendar (.ics)", type="secondary"):
-                export_trip_id = str(uuid.uuid4())[:8]
-                with st.spinner("📅 Generating Calendar..."):
-                    try:
-                        from ics import Calendar, Event
-                        
-                        cal = Calendar()
-                        start_date = datetime.now().date()
-                        
-                        # Create calendar events for each day
-                        for i in range(trip_data['num_days']):
-                            e = Event()
-                            e.name = f"🌍 {trip_data['destination']} Trip - Day {i+1}"
-                            e.begin = start_date + timedelta(days=i)
-                            e.description = f"Day {i+1} of your {trip_data['destination']} trip\\n\\nBudget: ₹{trip_data['budget']} INR\\n\\nSelected Options:\\n- Accommodation: {selected_accommodation}\\n- Activities: {', '.join(selected_activities)}\\n- Dining: {', '.join(selected_dining)}\\n- Transport: {selected_transport}\\n\\nItinerary:\\n{itinerary_text[:300]}..."
-                            e.duration = timedelta(hours=8)  # 8-hour events
-                            cal.events.add(e)
-                        
-                        ics_filename = f"trip_{trip_data['destination'].replace(' ', '_')}_{export_trip_id}.ics"
-                        ics_content = str(cal)
-                        
-                        st.download_button(
-                            "📥 Download Calendar", 
-                            ics_content, 
-                            file_name=ics_filename, 
-                            mime="text/calendar",
-                            key=f"calendar_download_{export_trip_id}"
-                        )
-                        st.success("✅ Calendar file ready for download!")
-                        
-                    except Exception as e:
-                        st.error(f"❌ Error creating calendar: {str(e)}")
-                        st.info("💡 Installing required packages...")
-                        # Attempt to install ics package
-                        try:
-                            import subprocess
-                            subprocess.check_call(["pip", "install", "ics"])
-                            st.info("📦 ics package installed. Please try again.")
-                        except:
-                            st.warning("⚠️ Could not auto-install calendar dependencies. You may need to install the 'ics' package manually.")
+    for stage, stats in attempt_summary().items():
+        latency = f", p95 {stats['p95_seconds']:.2f}s" if stats["p95_seconds"] is not None else ""
+        st.write(
+            f"{stage}: {stats['attempts']} attempts, {stats['retried']} retried, "
+            f"{stats['hedged']} hedged, {stats['failed']} failed{latency}"
+        )
 
-        # Enhanced Map with better geocoding
-        st.subheader("🗺️ Interactive Destination Map")
-        
-        if not MAP_AVAILABLE:
-            st.warning("⚠️ Interactive maps are not available. The required mapping libraries are not installed.")
-            st.info(f"📍 Your destination: {trip_data['destination']}")
-            st.info("🗺️ You can search for this destination on Google Maps for detailed location information.")
-        else:
-            # Simplified geocoding approach
-            def get_coordinates(destination_name):
-                """Get coordinates using a simple mapping approach with AI fallback"""
-                # Common destinations mapping
-                location_coords = {
-                    "delhi": (28.6139, 77.2090),
-                    "mumbai": (19.0760, 72.8777),
-                    "bangalore": (12.9716, 77.5946),
-                    "chennai": (13.0827, 80.2707),
-                    "kolkata": (22.5726, 88.3639),
-                    "hyderabad": (17.3850, 78.4867),
-                    "pune": (18.5204, 73.8567),
-                    "ahmedabad": (23.0225, 72.5714),
-                    "jaipur": (26.9124, 75.7873),
-                    "goa": (15.2993, 74.1240),
-                    "kerala": (10.8505, 76.2711),
-                    "kashmir": (34.0837, 74.7973),
-                    "rajasthan": (27.0238, 74.2179),
-                    "uttarakhand": (30.0668, 79.0193),
-                    "himachal pradesh": (31.1048, 77.1734),
-                    "paris": (48.8566, 2.3522),
-                    "london": (51.5074, -0.1278),
-                    "new york": (40.7128, -74.0060),
-                    "tokyo": (35.6762, 139.6503),
-                    "bangkok": (13.7563, 100.5018),
-                    "dubai": (25.2048, 55.2708),
-                    "singapore": (1.3521, 103.8198),
-                    "malaysia": (4.2105, 101.9758),
-                    "indonesia": (-0.7893, 113.9213),
-                    "thailand": (15.8700, 100.9925),
-                    "nepal": (28.3949, 84.1240),
-                    "bhutan": (27.5142, 90.4336),
-                    "sri lanka": (7.8731, 80.7718),
-                    "maldives": (3.2028, 73.2207)
-                }
-                
-                dest_lower = destination_name.lower()
-                for key, coords in location_coords.items():
-                    if key in dest_lower:
-                        return coords
-                
-                # AI fallback for unknown destinations
-                try:
-                    geocode_llm = ChatOpenAI(
-                        model="gpt-4o-mini",
-                        openai_api_key=github_token,
-                        openai_api_base="https://models.inference.ai.azure.com"
-                    )
-                    
-                    geocode_prompt = f"""
-                    What are the latitude and longitude coordinates for {destination_name}?
-                    Respond ONLY with: latitude,longitude
-                    Example: 28.6139,77.2090
-                    """
-                    
-                    response = geocode_llm.invoke(geocode_prompt)
-                    coords_text = response.content.strip()
-                    
-                    if ',' in coords_text:
-                        lat_str, lon_str = coords_text.split(',')
-                        return float(lat_str.strip()), float(lon_str.strip())
-                except:
-                    pass
-                    
-                # Default fallback to India center
-                return 20.5937, 78.9629
-            
-            try:
-                with st.spinner("🌍 Locating destination on map..."):
-                    lat, lon = get_coordinates(trip_data['destination'])
-                    st.success(f"📍 Located: {trip_data['destination']} at {lat:.4f}, {lon:.4f}")
-                    
-                # Create and display map
-                import folium
-                from streamlit_folium import st_folium
-                
-                map_obj = folium.Map(
-                    location=[lat, lon], 
-                    zoom_start=8,
-                    tiles='OpenStreetMap'
-                )
-                
-                # Add destination marker
-                folium.Marker(
-                    [lat, lon], 
-                    popup=f"🎯 {trip_data['destination']}",
-                    tooltip=f"📍 {trip_data['destination']} - Your destination!",
-                    icon=folium.Icon(color='red', icon='star')
-                ).add_to(map_obj)
-                
-                # Display map
-                map_data = st_folium(map_obj, width=700, height=400, returned_objects=["last_object_clicked"])
-                st.caption(f"📍 Showing location of {trip_data['destination']}")
-                
-            except Exception as e:
-                st.warning(f"⚠️ Map display error: {str(e)}")
-                st.info(f"📍 Your destination: {trip_data['destination']}")
-                lat, lon = get_coordinates(trip_data['destination'])
-                st.info(f"🗺️ Coordinates: {lat:.4f}, {lon:.4f}")
-                
-                # Fallback: show a simple text-based location info
-                st.markdown(f"""
-                **📍 Location Information:**
-                - **Destination:** {trip_data['destination']}
-                - **Coordinates:** {lat:.4f}, {lon:.4f}
-                - You can search for "{trip_data['destination']}" on Google Maps for detailed location information.
-                """)
 
 # Enhanced trip history with research data
-if st.session_state.trip_history:
+@timed_fragment("history")
+def trip_history_section():
+    """Every trip planned in this session, most recent first"""
     st.markdown("## 📚 Trip History (Current Session)")
     st.markdown("*All your planned trips are saved in this session*")
     
@@ -999,3 +1291,7 @@ if st.session_state.trip_history:
                         st.write(f"✨ **Special Requests:** {preferences.get('special_requests')}")
                 else:
                     st.write("No preference data available for this trip.")
+
+
+if st.session_state.trip_history:
+    trip_history_section()
@@ -0,0 +1,89 @@
+"""Compare research modes on the same trips: model calls, tool calls, prompt tokens and latency
+
+Record once, then replay so every mode sees identical model and search responses:
+    LLM_BACKEND_MODE=record python benchmark_research.py --modes agent,tools
+    LLM_BACKEND_MODE=replay python benchmark_research.py --modes agent,tools --repeats 5
+"""
+import argparse
+import json
+import os
+import statistics
+
+from dotenv import load_dotenv
+
+from call_policy import percentile
+from cassette import make_search
+from llm_client import configure_llm_clients, get_llm
+from research import RESEARCH_MODES, run_research
+
+
+def summarize(mode, runs):
+    latencies = sorted(run["total_seconds"] for run in runs)
+    stop_reasons = {}
+    for run in runs:
+        stop_reasons[run.get("stop_reason", "n/a")] = stop_reasons.get(run.get("stop_reason", "n/a"), 0) + 1
+    return {
+        "mode": mode,
+        "runs": len(runs),
+        "model_calls": statistics.mean(run.get("model_calls", len(run.get("step_prompt_tokens", []))) for run in runs),
+        "tool_calls": statistics.mean(run.get("tool_calls", len(run.get("search_terms", []))) for run in runs),
+        "prompt_tokens": statistics.mean(run.get("prompt_tokens", sum(run.get("step_prompt_tokens", []))) for run in runs),
+        "result_tokens": statistics.mean(run.get("result_tokens", 0) for run in runs),
+        "p50_seconds": percentile(latencies, 0.50),
+        "p95_seconds": percentile(latencies, 0.95),
+        "stop_reasons": stop_reasons,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default="agent,tools", help=f"comma-separated from {', '.join(RESEARCH_MODES)}")
+    parser.add_argument("--destinations", default="Goa,Jaipur,Paris", help="comma-separated")
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--budget", type=int, default=50000)
+    parser.add_argument("--language", default="English")
+    parser.add_argument("--repeats", type=int, default=1, help="runs per destination and mode")
+    parser.add_argument("--report", help="also write the summary and every run's metrics to this JSON file")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    github_token = os.getenv("GITHUB_TOKEN")
+    serp_api_key = os.getenv("SERPAPI_API_KEY")
+    if not github_token or not serp_api_key:
+        parser.error("GITHUB_TOKEN and SERPAPI_API_KEY must be set (placeholders are fine in replay mode)")
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in RESEARCH_MODES]
+    if unknown:
+        parser.error(f"unknown research mode(s): {', '.join(unknown)}")
+
+    configure_llm_clients(github_token)
+    llm = get_llm()
+    # No caches or research store: every run makes all of its calls
+    search = make_search(serp_api_key)
+    trips = [
+        {"destination": d.strip(), "num_days": args.days, "budget": args.budget, "language": args.language}
+        for d in args.destinations.split(",") if d.strip()
+    ]
+
+    runs = {mode: [] for mode in modes}
+    for _ in range(args.repeats):
+        for trip in trips:
+            for mode in modes:
+                _, metrics = run_research(llm, search, trip, mode=mode)
+                runs[mode].append(dict(metrics, destination=trip["destination"]))
+
+    summary = [summarize(mode, mode_runs) for mode, mode_runs in runs.items()]
+    print(f"{'mode':<10}{'runs':>6}{'model calls':>13}{'tool calls':>12}{'prompt tok':>12}{'p50 s':>9}{'p95 s':>9}  stop reasons")
+    for row in summary:
+        print(
+            f"{row['mode']:<10}{row['runs']:>6}{row['model_calls']:>13.1f}{row['tool_calls']:>12.1f}"
+            f"{row['prompt_tokens']:>12.0f}{row['p50_seconds']:>9.2f}{row['p95_seconds']:>9.2f}  "
+            + ", ".join(f"{reason} ×{count}" for reason, count in row["stop_reasons"].items())
+        )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "runs": runs}, f, indent=2, ensure_ascii=False, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import contextvars
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Whole-stage deadlines in seconds, overridable with CALL_DEADLINE_<STAGE>
+STAGE_DEADLINES = {
+    "research": 180,
+    "recommendation": 60,
+    "planner": 240,
+    "geocode": 15,
+}
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="call-policy")
+_attempts = deque(maxlen=1000)
+_attempts_lock = threading.Lock()
+_policies = {}
+_policies_lock = threading.Lock()
+# Set once the policy stops waiting for the attempt running in this context
+_abandoned = contextvars.ContextVar("call_policy_abandoned", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage runs past its deadline across all attempts"""
+
+
+def attempt_checkpoint():
+    """Raise DeadlineExceeded inside an attempt the policy has given up on; long stages call this between steps"""
+    abandoned = _abandoned.get()
+    if abandoned is not None and abandoned.is_set():
+        raise DeadlineExceeded("the call policy stopped waiting for this attempt")
+
+
+def is_retryable(error):
+    """429s, 5xx responses, timeouts and connection failures are worth another attempt"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    # Only reached once a model call has failed, so the SDK is loaded by then
+    import openai
+    return isinstance(error, (openai.APIConnectionError, ConnectionError, TimeoutError))
+
+
+def _record_attempt(stage, attempt, hedged, started, outcome, error=None):
+    with _attempts_lock:
+        _attempts.append({
+            "stage": stage,
+            "attempt": attempt,
+            "hedged": hedged,
+            "latency_seconds": time.perf_counter() - started,
+            "outcome": outcome,
+            "error": type(error).__name__ if error is not None else None,
+            "at": time.time(),
+        })
+
+
+def attempt_log(stage=None):
+    """Per-attempt records, oldest first"""
+    with _attempts_lock:
+        return [a for a in _attempts if stage is None or a["stage"] == stage]
+
+
+def attempt_summary():
+    """Per-stage attempt counts, retries, hedges and latency percentiles of successful attempts"""
+    summary = {}
+    for record in attempt_log():
+        stats = summary.setdefault(record["stage"], {"attempts": 0, "ok": 0, "retried": 0, "hedged": 0, "failed": 0, "latencies": []})
+        stats["attempts"] += 1
+        stats["hedged"] += record["hedged"]
+        if record["outcome"] == "ok":
+            stats["ok"] += 1
+            stats["latencies"].append(record["latency_seconds"])
+        elif record["outcome"] == "retry":
+            stats["retried"] += 1
+        else:
+            stats["failed"] += 1
+    for stats in summary.values():
+        latencies = sorted(stats.pop("latencies"))
+        stats["p50_seconds"] = percentile(latencies, 0.50)
+        stats["p95_seconds"] = percentile(latencies, 0.95)
+    return summary
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class CallPolicy:
+    """Deadline, jittered exponential backoff and optional hedging around one stage's calls"""
+
+    def __init__(self, stage, deadline_seconds, max_attempts=4, base_delay=0.5, max_delay=8.0, hedge=False, hedge_min_samples=20):
+        self.stage = stage
+        self.deadline_seconds = deadline_seconds
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies = deque(maxlen=200)
+
+    def backoff_delay(self, attempt):
+        """Full-jitter exponential backoff for the given 1-based attempt number"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def hedge_after(self):
+        """Observed p95 latency once enough samples exist, else None"""
+        if not self.hedge or len(self._latencies) < self.hedge_min_samples:
+            return None
+        return percentile(sorted(self._latencies), 0.95)
+
+    def call(self, fn, *args, **kwargs):
+        deadline = time.monotonic() + self.deadline_seconds
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return self._attempt(attempt, deadline, fn, args, kwargs)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                remaining = deadline - time.monotonic()
+                if not is_retryable(e) or attempt == self.max_attempts or remaining <= 0:
+                    raise
+                time.sleep(min(self.backoff_delay(attempt), remaining))
+        raise DeadlineExceeded(f"{self.stage} exhausted {self.max_attempts} attempts")
+
+    def _submit(self, fn, args, kwargs):
+        """Run fn on the executor; returns its future and the event that tells it to stop at its next checkpoint"""
+        abandoned = threading.Event()
+        context = contextvars.copy_context()
+        context.run(_abandoned.set, abandoned)
+        return _executor.submit(context.run, fn, *args, **kwargs), abandoned
+
+    def _attempt(self, attempt, deadline, fn, args, kwargs):
+        started = time.perf_counter()
+        future, abandoned = self._submit(fn, args, kwargs)
+        futures = {future: (False, abandoned)}
+        hedge_after = self.hedge_after()
+        if hedge_after is not None:
+            done, _ = wait(futures, timeout=min(hedge_after, max(0, deadline - time.monotonic())))
+            if not done and time.monotonic() < deadline:
+                future, abandoned = self._submit(fn, args, kwargs)
+                futures[future] = (True, abandoned)
+        last_error = None
+        while futures:
+            done, _ = wait(futures, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                _record_attempt(self.stage, attempt, len(futures) > 1, started, "timeout")
+                _abandon(futures)
+                raise DeadlineExceeded(f"{self.stage} exceeded its {self.deadline_seconds}s deadline")
+            for future in done:
+                hedged, _ = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                self._latencies.append(time.perf_counter() - started)
+                _record_attempt(self.stage, attempt, hedged, started, "ok")
+                # The losing hedge is no longer needed either
+                _abandon(futures)
+                return result
+        outcome = "retry" if is_retryable(last_error) and attempt < self.max_attempts else "error"
+        _record_attempt(self.stage, attempt, False, started, outcome, last_error)
+        raise last_error
+
+    def stream(self, fn, *args, **kwargs):
+        """Yield from a streaming call, retrying only failures that happen before the first chunk"""
+        deadline = time.monotonic() + self.deadline_seconds
+        for attempt in range(1, self.max_attempts + 1):
+            started = time.perf_counter()
+            first_chunk_seen = False
+            try:
+                for chunk in _read_until(fn(*args, **kwargs), deadline):
+                    first_chunk_seen = True
+                    yield chunk
+                self._latencies.append(time.perf_counter() - started)
+                _record_attempt(self.stage, attempt, False, started, "ok")
+                return
+            except DeadlineExceeded:
+                _record_attempt(self.stage, attempt, False, started, "timeout")
+                raise DeadlineExceeded(f"{self.stage} exceeded its {self.deadline_seconds}s deadline") from None
+            except Exception as e:
+                remaining = deadline - time.monotonic()
+                retry = not first_chunk_seen and is_retryable(e) and attempt < self.max_attempts and remaining > 0
+                _record_attempt(self.stage, attempt, False, started, "retry" if retry else "error", e)
+                if not retry:
+                    raise
+                time.sleep(min(self.backoff_delay(attempt), remaining))
+
+
+def _abandon(futures):
+    """Stop attempts nobody is waiting for: queued ones never start, running ones stop at their next checkpoint"""
+    for future, (_, abandoned) in futures.items():
+        abandoned.set()
+        future.cancel()
+
+
+def _read_until(chunks, deadline):
+    """Yield from chunks, read on the executor so a stream that stalls past the deadline is cut off"""
+    buffer = queue.Queue()
+    stop = threading.Event()
+
+    def read():
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    break
+                buffer.put((True, chunk))
+            buffer.put((False, None))
+        except Exception as e:
+            buffer.put((False, e))
+        finally:
+            # Closes the HTTP response as soon as the reader stops
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    _executor.submit(contextvars.copy_context().run, read)
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise queue.Empty
+                more, item = buffer.get(timeout=remaining)
+            except queue.Empty:
+                raise DeadlineExceeded("the stream ran past its deadline") from None
+            if not more:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def get_call_policy(stage):
+    """Return the shared policy for a stage, configured from the environment on first use"""
+    with _policies_lock:
+        policy = _policies.get(stage)
+        if policy is None:
+            policy = CallPolicy(
+                stage,
+                deadline_seconds=float(os.getenv(f"CALL_DEADLINE_{stage.upper()}", str(STAGE_DEADLINES.get(stage, 60)))),
+                max_attempts=int(os.getenv("CALL_MAX_ATTEMPTS", "4")),
+                hedge=os.getenv("CALL_HEDGE", "0") == "1",
+            )
+            _policies[stage] = policy
+        return policy
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any
+
+from langchain_core.load import dumpd, load
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+
+# live: call the real services, record: call them and save every response, replay: serve saved responses only
+BACKEND_MODES = ("live", "record", "replay")
+DEFAULT_CASSETTE_DIR = "cassettes"
+
+# Streaming-only flags that must not change which recording a call maps to
+_IGNORED_KWARGS = {"stream_usage"}
+
+
+class CassetteMissError(KeyError):
+    """Raised in replay mode when no recording exists for a request"""
+
+
+def backend_mode():
+    mode = os.getenv("LLM_BACKEND_MODE", "live").lower()
+    if mode not in BACKEND_MODES:
+        raise ValueError(f"LLM_BACKEND_MODE must be one of {', '.join(BACKEND_MODES)}, got {mode!r}")
+    return mode
+
+
+def replay_latency_seconds():
+    return int(os.getenv("REPLAY_LATENCY_MS", "0")) / 1000
+
+
+class CassetteStore:
+    """Request/response pairs stored as one JSON file per request hash"""
+
+    def __init__(self, path=DEFAULT_CASSETTE_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def make_key(kind, request):
+        payload = json.dumps([kind, request], sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._file(key), encoding="utf-8") as f:
+                return json.load(f)["response"]
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, kind, request, response):
+        record = {"kind": kind, "request": request, "response": response, "recorded_at": time.time()}
+        with self._lock:
+            tmp_file = self._file(key) + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False, default=str, indent=1)
+            os.replace(tmp_file, self._file(key))
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_cassette_store():
+    path = os.getenv("CASSETTE_DIR", DEFAULT_CASSETTE_DIR)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = CassetteStore(path)
+        return _stores[path]
+
+
+def _stable_message(message):
+    """Serialized message without its per-run id, which LangChain generates afresh on every invoke"""
+    serialized = dumpd(message)
+    serialized.get("kwargs", {}).pop("id", None)
+    return serialized
+
+
+class CassetteChatOpenAI(ChatOpenAI):
+    """ChatOpenAI that records responses to, or replays them from, a CassetteStore"""
+
+    cassette_mode: str = "record"
+    cassette_store: Any = None
+
+    def _request(self, messages, stop, kwargs):
+        return {
+            "model": self.model_name,
+            "messages": [_stable_message(m) for m in messages],
+            "stop": stop,
+            "kwargs": {k: v for k, v in kwargs.items() if k not in _IGNORED_KWARGS},
+        }
+
+    def _replay(self, request):
+        key = CassetteStore.make_key("chat", request)
+        response = self.cassette_store.get(key)
+        if response is None:
+            raise CassetteMissError(f"No recorded LLM response for request {key[:12]}")
+        time.sleep(replay_latency_seconds())
+        return load(response["message"], allowed_objects="messages")
+
+    def _record(self, request, message):
+        key = CassetteStore.make_key("chat", request)
+        self.cassette_store.put(key, "chat", request, {"message": dumpd(message)})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        request = self._request(messages, stop, kwargs)
+        if self.cassette_mode == "replay":
+            return ChatResult(generations=[ChatGeneration(message=self._replay(request))])
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._record(request, result.generations[0].message)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        request = self._request(messages, stop, kwargs)
+        if self.cassette_mode == "replay":
+            message = self._replay(request)
+            # Replay the recorded text word by word so streaming consumers behave as they do live
+            for i, word in enumerate(str(message.content).split(" ")):
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            return
+        collected = None
+        for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            collected = chunk if collected is None else collected + chunk
+            yield chunk
+        if collected is not None:
+            message = collected.message
+            self._record(request, message.model_copy(update={"response_metadata": {}}))
+
+
+class CassetteSearch:
+    """SerpAPIWrapper stand-in that records or replays run() and results() calls"""
+
+    def __init__(self, search=None, mode="record", store=None):
+        self.search = search
+        self.mode = mode
+        self.store = store or get_cassette_store()
+
+    def _call(self, method, query):
+        request = {"method": method, "query": query}
+        key = CassetteStore.make_key("search", request)
+        if self.mode == "replay":
+            response = self.store.get(key)
+            if response is None:
+                raise CassetteMissError(f"No recorded search response for {query!r}")
+            time.sleep(replay_latency_seconds())
+            return response["result"]
+        result = getattr(self.search, method)(query)
+        self.store.put(key, "search", request, {"result": result})
+        return result
+
+    def run(self, query):
+        return self._call("run", query)
+
+    def results(self, query):
+        return self._call("results", query)
+
+
+def make_search(api_key):
+    """Return the search backend for the current LLM_BACKEND_MODE"""
+    from langchain_community.utilities import SerpAPIWrapper
+
+    mode = backend_mode()
+    if mode == "live":
+        return SerpAPIWrapper(serpapi_api_key=api_key)
+    if mode == "replay":
+        return CassetteSearch(search=None, mode="replay")
+    return CassetteSearch(search=SerpAPIWrapper(serpapi_api_key=api_key), mode="record")
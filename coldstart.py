@@ -0,0 +1,118 @@
+"""Report the imports behind the app's first page paint and fail when cold start goes over budget
+
+Runs the first script run of Travel_Agent.py in a fresh interpreter under `python -X importtime`:
+    python coldstart.py                    # per-module import report; exit 1 if those imports take over 300 ms
+    python coldstart.py --budget-ms 0      # report only
+Exits 1 when the budget is exceeded or a module that should load lazily is imported before any click.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Travel_Agent.py")
+# The first page's imports take about 100 ms; any heavy stack loaded eagerly costs far more than the headroom
+DEFAULT_BUDGET_MS = 300
+# Only needed after a button press, so importing any of them on first paint is a regression
+LAZY_MODULES = (
+    "openai",
+    "langchain_openai",
+    "langchain",
+    "langchain_community",
+    "tiktoken",
+    "folium",
+    "streamlit_folium",
+    "ics",
+    "pdfkit",
+    "weasyprint",
+    "reportlab",
+)
+MARKER = "coldstart: first page paint"
+
+# Streamlit and its test harness are imported before the marker, so only the app's own imports are measured
+_CHILD = f"""
+import sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({APP_PATH!r}, default_timeout=120)
+sys.stderr.write({MARKER!r} + "\\n")
+start = time.perf_counter()
+app.run()
+sys.stderr.write({MARKER!r} + " %.6f\\n" % (time.perf_counter() - start))
+"""
+
+
+def parse_importtime(lines):
+    """Top-level (module, cumulative ms) pairs and every module name from `-X importtime` output"""
+    top_level, modules = [], []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # the header row
+        module = name.strip()
+        modules.append(module)
+        if not name[1:].startswith(" "):
+            top_level.append((module, int(cumulative) / 1000))
+    return top_level, modules
+
+
+def measure():
+    """Import the app's first page paint in a fresh interpreter; returns (top-level imports, modules, run seconds)"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        cwd=os.path.dirname(APP_PATH), env=env, capture_output=True, text=True,
+    )
+    lines = result.stderr.splitlines()
+    marks = [i for i, line in enumerate(lines) if line.startswith(MARKER)]
+    if result.returncode != 0 or len(marks) != 2:
+        raise RuntimeError(f"first page paint failed:\n{result.stderr[-2000:]}")
+    top_level, modules = parse_importtime(lines[marks[0] + 1:marks[1]])
+    return top_level, modules, float(lines[marks[1]].split()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget-ms", type=float, default=float(os.getenv("COLDSTART_BUDGET_MS", str(DEFAULT_BUDGET_MS))),
+        help=f"fail when the first page paint's imports take longer (default: COLDSTART_BUDGET_MS or {DEFAULT_BUDGET_MS}, 0 = report only)",
+    )
+    parser.add_argument("--top", type=int, default=15, help="slowest top-level imports to list")
+    parser.add_argument("--report", help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    top_level, modules, run_seconds = measure()
+    import_ms = sum(ms for _, ms in top_level)
+    eager = sorted({m.split(".")[0] for m in modules} & set(LAZY_MODULES))
+
+    print(f"First page paint: {run_seconds * 1000:.0f} ms, of which imports {import_ms:.0f} ms ({len(modules)} modules)")
+    for module, ms in sorted(top_level, key=lambda item: -item[1])[:args.top]:
+        print(f"{ms:>9.1f} ms  {module}")
+    failures = []
+    if eager:
+        failures.append(f"imported before first use: {', '.join(eager)}")
+    if args.budget_ms and import_ms > args.budget_ms:
+        failures.append(f"imports took {import_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    if args.report:
+        directory = os.path.dirname(args.report)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({
+                "run_ms": run_seconds * 1000,
+                "import_ms": import_ms,
+                "budget_ms": args.budget_ms,
+                "imports": [{"module": m, "ms": ms} for m, ms in top_level],
+                "eager_lazy_modules": eager,
+                "failures": failures,
+            }, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from quota import as_completed_showing_quota
+from research_sections import SECTION_HEADINGS, section_price_ranges
+from research_store import canonical_destination, stored_research
+
+MAX_COMPARED_DESTINATIONS = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _comparison_pool():
+    """One pool for every session's comparisons, so COMPARE_WORKERS bounds the research running at once"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=int(os.getenv("COMPARE_WORKERS", "3")), thread_name_prefix="compare"
+            )
+        return _pool
+
+
+def parse_destinations(text):
+    """Comma- or newline-separated destinations, deduplicated, at most MAX_COMPARED_DESTINATIONS"""
+    names = [name.strip() for part in text.splitlines() for name in part.split(",")]
+    unique = {}
+    for name in names:
+        if name:
+            unique.setdefault(canonical_destination(name), name)
+    return list(unique.values())[:MAX_COMPARED_DESTINATIONS]
+
+
+def format_price_range(price_range):
+    if price_range is None:
+        return "–"
+    low, high = price_range
+    return f"₹{low:,.0f}" if low == high else f"₹{low:,.0f} – ₹{high:,.0f}"
+
+
+def comparison_row(destination, research=None, metrics=None, error=None):
+    """One table row: destination, price range per research section, and status"""
+    row = {"Destination": destination}
+    ranges = section_price_ranges(research) if research else {}
+    for category, heading in SECTION_HEADINGS.items():
+        row[heading.split()[0].title()] = format_price_range(ranges.get(category))
+    if error is not None:
+        row["Status"] = f"failed: {error}"
+    elif metrics is None:
+        row["Status"] = "researching…"
+    else:
+        row["Status"] = f"{metrics['mode']} in {metrics['total_seconds']:.1f}s"
+    return row
+
+
+def compare_destinations(store, llm, search, trips, policy=None):
+    """Research every trip on the shared pool, yielding (trip_data, research, metrics, error) as each finishes"""
+    pool = _comparison_pool()
+    futures = {
+        pool.submit(contextvars.copy_context().run, stored_research, store, llm, search, trip, policy): trip
+        for trip in trips
+    }
+    for future in as_completed_showing_quota(futures):
+        trip = futures[future]
+        try:
+            research, metrics = future.result()
+            yield trip, research, metrics, None
+        except Exception as e:
+            yield trip, None, None, e
+
+
+def run_comparison(store, llm, search, trips, policy=None, on_result=None):
+    """Research all trips, calling on_result(rows) after each finishes
+
+    Returns (rows in input order, {destination: research text}, elapsed seconds).
+    """
+    start = time.perf_counter()
+    rows = {trip["destination"]: comparison_row(trip["destination"]) for trip in trips}
+    research = {}
+    if on_result is not None:
+        on_result(list(rows.values()))
+    for trip, text, metrics, error in compare_destinations(store, llm, search, trips, policy):
+        rows[trip["destination"]] = comparison_row(trip["destination"], text, metrics, error)
+        if text is not None:
+            research[trip["destination"]] = text
+        if on_result is not None:
+            on_result(list(rows.values()))
+    return list(rows.values()), research, time.perf_counter() - start
@@ -0,0 +1,32 @@
+# Coordinates of popular destinations, matched by substring before falling back to the LLM geocoder
+LOCATION_COORDS = {
+    "delhi": (28.6139, 77.2090),
+    "mumbai": (19.0760, 72.8777),
+    "bangalore": (12.9716, 77.5946),
+    "chennai": (13.0827, 80.2707),
+    "kolkata": (22.5726, 88.3639),
+    "hyderabad": (17.3850, 78.4867),
+    "pune": (18.5204, 73.8567),
+    "ahmedabad": (23.0225, 72.5714),
+    "jaipur": (26.9124, 75.7873),
+    "goa": (15.2993, 74.1240),
+    "kerala": (10.8505, 76.2711),
+    "kashmir": (34.0837, 74.7973),
+    "rajasthan": (27.0238, 74.2179),
+    "uttarakhand": (30.0668, 79.0193),
+    "himachal pradesh": (31.1048, 77.1734),
+    "paris": (48.8566, 2.3522),
+    "london": (51.5074, -0.1278),
+    "new york": (40.7128, -74.0060),
+    "tokyo": (35.6762, 139.6503),
+    "bangkok": (13.7563, 100.5018),
+    "dubai": (25.2048, 55.2708),
+    "singapore": (1.3521, 103.8198),
+    "malaysia": (4.2105, 101.9758),
+    "indonesia": (-0.7893, 113.9213),
+    "thailand": (15.8700, 100.9925),
+    "nepal": (28.3949, 84.1240),
+    "bhutan": (27.5142, 90.4336),
+    "sri lanka": (7.8731, 80.7718),
+    "maldives": (3.2028, 73.2207),
+}
@@ -0,0 +1,155 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from call_policy import percentile
+from quota import set_quota_session
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once its cancellation has been requested"""
+
+
+class Job:
+    """One background task: its state, progress message, partial output and result"""
+
+    def __init__(self, kind, session_id, meta=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.session_id = session_id
+        self.meta = meta or {}
+        self.state = "queued"
+        self.progress = "Waiting for a free worker"
+        self.waiting = None
+        self.partial = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def finished(self):
+        return self.state in ("done", "failed", "cancelled")
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def elapsed_seconds(self):
+        return (self.finished_at or time.time()) - self.created_at
+
+    def report(self, progress=None, partial=None):
+        """Update what the polling page shows, called from the job itself"""
+        if progress is not None:
+            self.progress = progress
+        if partial is not None:
+            self.partial = partial
+
+    def raise_if_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def quota_feedback(self, kind, position, depth):
+        """Quota queue feedback for a job, which has no page to write to"""
+        self.waiting = f"Waiting for {kind} quota: position {position} of {depth}" if position else None
+
+
+class JobRunner:
+    """Worker pool for research and planning that outlives the script run, rerun or page that started it"""
+
+    def __init__(self, max_workers=4, keep_seconds=3600):
+        self.keep_seconds = keep_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._run_seconds = deque(maxlen=500)
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, session_id="default", meta=None, **kwargs):
+        """Run fn(job, *args, **kwargs) on the pool in a copy of the caller's context and return the Job"""
+        job = Job(kind, session_id, meta)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(contextvars.copy_context().run, self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            job.state, job.finished_at = "cancelled", time.time()
+            return
+        job.state, job.started_at = "running", time.time()
+        set_quota_session(job.session_id, feedback=job.quota_feedback)
+        try:
+            result = fn(job, *args, **kwargs)
+            # Work that ran to the end anyway is dropped once nobody is waiting for it
+            job.result, job.state = (None, "cancelled") if job.cancelled else (result, "done")
+        except JobCancelled:
+            job.state = "cancelled"
+        except Exception as e:
+            job.error, job.state = e, "failed"
+        finally:
+            job.waiting = None
+            job.finished_at = time.time()
+            if job.state == "done":
+                with self._lock:
+                    self._run_seconds.append(job.finished_at - job.started_at)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Ask a job to stop; a queued job never starts, a running one stops at its next checkpoint"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            job.state, job.finished_at = "cancelled", time.time()
+        return True
+
+    def discard(self, job_id):
+        """Forget a finished job once its result has been picked up"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _prune(self):
+        """Drop finished jobs nobody picked up within keep_seconds"""
+        cutoff = time.time() - self.keep_seconds
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            durations = sorted(self._run_seconds)
+        counts = {state: 0 for state in ("queued", "running", "done", "failed", "cancelled")}
+        for job in jobs:
+            counts[job.state] += 1
+        return dict(
+            counts,
+            p50_run_seconds=percentile(durations, 0.50),
+            p95_run_seconds=percentile(durations, 0.95),
+        )
+
+
+def get_job_runner():
+    """Return the process-wide job runner, sized by JOB_WORKERS on first use"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(
+                max_workers=int(os.getenv("JOB_WORKERS", "4")),
+                keep_seconds=int(os.getenv("JOB_KEEP_SECONDS", "3600")),
+            )
+        return _runner
@@ -0,0 +1,23 @@
+from langchain_core.callbacks import BaseCallbackHandler
+
+from llm_client import record_llm_call
+
+
+class CallCountingHandler(BaseCallbackHandler):
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        record_llm_call()
+
+
+class QuotaCallbackHandler(BaseCallbackHandler):
+    """Hold every chat model request until the inference quota grants it"""
+
+    raise_error = True
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.scheduler.acquire()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.scheduler.acquire()
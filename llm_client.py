@@ -0,0 +1,96 @@
+import os
+import threading
+from contextvars import ContextVar
+
+from quota import get_scheduler
+
+GITHUB_MODELS_BASE_URL = "https://models.inference.ai.azure.com"
+DEFAULT_MODEL = "gpt-4o-mini"
+
+_lock = threading.Lock()
+_config = None
+_http_client = None
+_clients = {}
+_call_counter = ContextVar("llm_call_counter", default=None)
+_call_counter_lock = threading.Lock()
+
+
+def count_llm_calls(counter):
+    """Add every model request made from this context (and threads copied from it) to counter["calls"]"""
+    counter.setdefault("calls", 0)
+    _call_counter.set(counter)
+
+
+def record_llm_call():
+    counter = _call_counter.get()
+    if counter is not None:
+        with _call_counter_lock:
+            counter["calls"] += 1
+
+
+def configure_llm_clients(api_key, base_url=GITHUB_MODELS_BASE_URL, max_connections=20, keepalive_seconds=60):
+    """Set the shared keep-alive HTTP pool's settings; the pool itself opens on the first get_llm()"""
+    global _config, _http_client
+    config = (api_key, base_url, max_connections, keepalive_seconds)
+    with _lock:
+        if config == _config:
+            return
+        old_http_client = _http_client
+        _http_client = None
+        _config = config
+        _clients.clear()
+    if old_http_client is not None:
+        old_http_client.close()
+
+
+def _open_http_client():
+    import httpx
+
+    _, _, max_connections, keepalive_seconds = _config
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_seconds,
+        ),
+        timeout=httpx.Timeout(120.0, connect=10.0),
+    )
+
+
+def get_llm(model=None, **kwargs):
+    """Return the shared ChatOpenAI for this model and settings, creating it on first use"""
+    global _http_client
+    if _config is None:
+        raise RuntimeError("configure_llm_clients() must be called before get_llm()")
+    model = model or os.getenv("MODEL", DEFAULT_MODEL)
+    key = (model, tuple(sorted(kwargs.items())))
+    with _lock:
+        llm = _clients.get(key)
+        if llm is None:
+            # The OpenAI and LangChain stack loads with the first client, not with the app
+            from langchain_openai import ChatOpenAI
+
+            from cassette import CassetteChatOpenAI, backend_mode, get_cassette_store
+            from llm_callbacks import CallCountingHandler, QuotaCallbackHandler
+
+            if _http_client is None:
+                _http_client = _open_http_client()
+            api_key, base_url = _config[0], _config[1]
+            mode = backend_mode()
+            if mode != "live":
+                kwargs = dict(kwargs, cassette_mode=mode, cassette_store=get_cassette_store())
+            llm = (ChatOpenAI if mode == "live" else CassetteChatOpenAI)(
+                model=model,
+                openai_api_key=api_key,
+                openai_api_base=base_url,
+                http_client=_http_client,
+                # Retries and backoff are owned by call_policy, not the OpenAI SDK
+                **{"max_retries": 0, **kwargs},
+                # Every request, including each step of the research agent, waits for the shared inference quota;
+                # replayed responses never reach the API, so they skip it
+                callbacks=[CallCountingHandler()] + (
+                    [] if mode == "replay" else [QuotaCallbackHandler(get_scheduler("inference"))]
+                ),
+            )
+            _clients[key] = llm
+        return llm
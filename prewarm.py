@@ -0,0 +1,174 @@
+"""Pre-warm the shared research store and caches for a grid of popular trips
+
+Run before peak hours, e.g.:
+    python prewarm.py --days 3,7 --tiers budget,midrange --languages English,Hindi --recommendations
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from call_policy import percentile, get_call_policy
+from cassette import make_search
+from destinations import LOCATION_COORDS
+from llm_client import configure_llm_clients, get_llm
+from quota import all_scheduler_stats, get_scheduler
+from recommendations import DEFAULT_PREFERENCES, NO_RECOMMENDATION_PREFERENCES, recommendation_prompt, run_recommendations
+from research_sections import research_for_prompts
+from research_store import (
+    DEFAULT_RESEARCH_MAX_AGE_SECONDS,
+    DEFAULT_RESEARCH_STORE_PATH,
+    TIER_DAILY_BUDGETS,
+    ResearchStore,
+    stored_research,
+    tier_budget,
+)
+from response_cache import DEFAULT_CACHE_PATH, ResponseCache
+from search_cache import DEFAULT_SEARCH_CACHE_PATH, DEFAULT_SEARCH_TTLS, CachedSearch, search_ttls_from_env
+
+DEFAULT_REPORT_PATH = os.path.join(".cache", "prewarm_report.json")
+
+
+def trip_grid(destinations, days, tiers, languages):
+    """Every destination × duration × budget tier × language combination as trip_data dicts"""
+    return [
+        {"destination": destination.title(), "num_days": num_days, "budget": tier_budget(tier, num_days), "language": language}
+        for destination, num_days, tier, language in itertools.product(destinations, days, tiers, languages)
+    ]
+
+
+def prewarm_trip(store, cache, llm, search, trip_data, recommendations=False):
+    """Research one trip through the store and optionally fetch its default recommendations"""
+    start = time.perf_counter()
+    research, metrics = stored_research(store, llm, search, trip_data, policy=get_call_policy("research"))
+    result = {"trip": trip_data, "research": metrics["mode"], "research_seconds": metrics["total_seconds"]}
+    if recommendations:
+        categories = [c for c, preference in DEFAULT_PREFERENCES.items() if preference not in NO_RECOMMENDATION_PREFERENCES]
+        research_slices, _, _ = research_for_prompts(research, categories)
+        preferences = {category: DEFAULT_PREFERENCES[category] for category in categories}
+        prompts = {
+            category: recommendation_prompt(trip_data, category, preference, research_slices[category])
+            for category, preference in preferences.items()
+        }
+        usage = {}
+        errors = [
+            f"{category}: {error}"
+            for category, _, error in run_recommendations(
+                cache, llm, trip_data, preferences, prompts, research_slices, research,
+                policy=get_call_policy("recommendation"), usage=usage,
+            )
+            if error is not None
+        ]
+        result["recommendation_requests"] = usage.get("requests", 0)
+        if errors:
+            result["errors"] = errors
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--destinations", default=",".join(LOCATION_COORDS), help="comma-separated (default: every known destination)")
+    parser.add_argument("--days", default="3,7", help="comma-separated trip lengths (default: 3,7)")
+    parser.add_argument("--tiers", default="budget,midrange", help=f"comma-separated budget tiers from {', '.join(TIER_DAILY_BUDGETS)}")
+    parser.add_argument("--languages", default="English", help="comma-separated (default: English)")
+    parser.add_argument("--recommendations", action="store_true", help="also fetch recommendations for the default preferences")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("PREWARM_WORKERS", "4")), help="trips researched concurrently")
+    parser.add_argument("--report", default=DEFAULT_REPORT_PATH, help=f"where to write the throughput report (default: {DEFAULT_REPORT_PATH})")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    github_token = os.getenv("GITHUB_TOKEN")
+    serp_api_key = os.getenv("SERPAPI_API_KEY")
+    if not github_token or not serp_api_key:
+        parser.error("GITHUB_TOKEN and SERPAPI_API_KEY must be set")
+    tiers = [t.strip() for t in args.tiers.split(",") if t.strip()]
+    unknown = [t for t in tiers if t not in TIER_DAILY_BUDGETS]
+    if unknown:
+        parser.error(f"unknown budget tier(s): {', '.join(unknown)}")
+
+    configure_llm_clients(
+        github_token,
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+        keepalive_seconds=int(os.getenv("LLM_KEEPALIVE_SECONDS", "60")),
+    )
+    # Same stores and settings as the app, so every warmed entry is one the app will look up
+    store = ResearchStore(
+        path=os.getenv("RESEARCH_STORE_PATH", DEFAULT_RESEARCH_STORE_PATH),
+        max_age_seconds=int(os.getenv("RESEARCH_STORE_MAX_AGE_SECONDS", str(DEFAULT_RESEARCH_MAX_AGE_SECONDS))),
+    )
+    cache = ResponseCache(
+        path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500")),
+        ttl_seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600))),
+    )
+    search_cache = ResponseCache(
+        path=os.getenv("SEARCH_CACHE_PATH", DEFAULT_SEARCH_CACHE_PATH),
+        max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000")),
+        ttl_seconds=int(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(DEFAULT_SEARCH_TTLS["default"]))),
+    )
+    llm = get_llm()
+    search = CachedSearch(
+        make_search(serp_api_key), search_cache, ttls=search_ttls_from_env(), quota=get_scheduler("search")
+    )
+
+    trips = trip_grid(
+        [d.strip() for d in args.destinations.split(",") if d.strip()],
+        [int(d) for d in args.days.split(",") if d.strip()],
+        tiers,
+        [l.strip() for l in args.languages.split(",") if l.strip()],
+    )
+    print(f"Pre-warming {len(trips)} trips with {args.workers} workers")
+    start = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {
+            pool.submit(prewarm_trip, store, cache, llm, search, trip, args.recommendations): trip for trip in trips
+        }
+        for future in as_completed(futures):
+            trip = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"trip": trip, "errors": [str(e)]}
+            results.append(result)
+            status = "failed" if result.get("errors") else result["research"]
+            print(f"[{len(results)}/{len(trips)}] {trip['destination']}, {trip['num_days']} days, ₹{trip['budget']}, {trip['language']}: {status}")
+    elapsed = time.perf_counter() - start
+
+    durations = sorted(r["seconds"] for r in results if "seconds" in r)
+    report = {
+        "trips": len(trips),
+        "researched": sum(1 for r in results if r.get("research") not in (None, "stored")),
+        "already_fresh": sum(1 for r in results if r.get("research") == "stored"),
+        "failed": sum(1 for r in results if r.get("errors")),
+        "recommendation_requests": sum(r.get("recommendation_requests", 0) for r in results),
+        "workers": args.workers,
+        "elapsed_seconds": elapsed,
+        "trips_per_minute": len(results) / elapsed * 60 if elapsed else 0.0,
+        "p50_trip_seconds": percentile(durations, 0.50),
+        "p95_trip_seconds": percentile(durations, 0.95),
+        "research_store": store.stats(),
+        "llm_cache": cache.stats(),
+        "search_cache": search_cache.stats(),
+        "quota": all_scheduler_stats(),
+        "results": results,
+    }
+    directory = os.path.dirname(args.report)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(
+        f"{report['researched']} researched, {report['already_fresh']} already fresh, {report['failed']} failed "
+        f"in {elapsed:.1f}s ({report['trips_per_minute']:.1f} trips/min); report written to {args.report}"
+    )
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
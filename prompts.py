@@ -0,0 +1,41 @@
+import os
+from textwrap import dedent
+
+from research_sections import count_tokens
+
+
+def language_directive(language):
+    return f"CRITICAL: Respond ONLY in {language} language. Every word of the response must be in {language}."
+
+
+def trip_facts(trip_data):
+    return dedent(
+        f"""
+        DESTINATION: {trip_data['destination']}
+        DURATION: {trip_data['num_days']} days
+        BUDGET: ₹{trip_data['budget']} INR total
+        LANGUAGE: {trip_data['language']}
+        """
+    ).strip()
+
+
+def build_prompt(trip_data, research, instructions):
+    """Lay out a prompt with the stable parts first so prompts share the longest possible prefix
+
+    Order is always: language directive, trip facts, research, then the call-specific instructions.
+    """
+    return "\n\n".join([
+        language_directive(trip_data["language"]),
+        trip_facts(trip_data),
+        f"RESEARCH RESULTS:\n{research}",
+        dedent(instructions).strip(),
+    ])
+
+
+def shared_prefix(prompts):
+    """Return the (characters, tokens) the given prompts have in common at the start"""
+    prompts = [p for p in prompts if p]
+    if len(prompts) < 2:
+        return 0, 0
+    prefix = os.path.commonprefix(prompts)
+    return len(prefix), count_tokens(prefix)
@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextvars import ContextVar
+
+from call_policy import percentile
+
+# Requests per minute and burst size per budget, overridable with QUOTA_<KIND>_PER_MINUTE / QUOTA_<KIND>_BURST
+QUOTA_DEFAULTS = {
+    "inference": (15, 5),
+    "search": (30, 5),
+}
+
+_session = ContextVar("quota_session", default="default")
+_feedback = ContextVar("quota_feedback", default=None)
+_renderer = ContextVar("quota_renderer", default=None)
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+class QuotaTimeout(Exception):
+    """Raised when a caller waits longer than its limit for quota
+
+    Not a TimeoutError, so call policies give up instead of queueing the caller again.
+    """
+
+
+def set_quota_session(session_id, feedback=None, render=None):
+    """Attribute quota requests from this context to session_id, reporting queue positions to feedback(kind, position, depth)
+
+    feedback is called from whichever thread waits, so it must only record; render(), if given, is called by
+    as_completed_showing_quota from the thread that set it, to draw what feedback recorded.
+    """
+    _session.set(session_id)
+    _feedback.set(feedback)
+    _renderer.set((threading.current_thread(), render) if render is not None else None)
+
+
+class QueueStatus:
+    """One session's queue position per quota kind, recorded by waiting workers and read by the script thread"""
+
+    def __init__(self):
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, kind, position, depth):
+        # Kept per waiting thread, so one request getting its turn doesn't hide the others still queued
+        waiter = (kind, threading.get_ident())
+        with self._lock:
+            if position:
+                self._positions[waiter] = (position, depth)
+            else:
+                self._positions.pop(waiter, None)
+
+    def positions(self):
+        """{kind: (best position, queue depth)} across this session's waiting requests"""
+        with self._lock:
+            waiting = list(self._positions.items())
+        positions = {}
+        for (kind, _), (position, depth) in waiting:
+            best = positions.get(kind)
+            positions[kind] = (min(position, best[0]), max(depth, best[1])) if best else (position, depth)
+        return positions
+
+
+def as_completed_showing_quota(futures, poll_seconds=0.5):
+    """Yield futures as they complete, redrawing this context's quota feedback while none do
+
+    Only the thread that called set_quota_session(render=...) redraws; copies of its context in workers just wait.
+    """
+    renderer = _renderer.get()
+    render = renderer[1] if renderer is not None and renderer[0] is threading.current_thread() else None
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=poll_seconds if render else None, return_when=FIRST_COMPLETED)
+        if render is not None:
+            render()
+        yield from done
+
+
+def _notify(feedback, kind, position, depth):
+    """Feedback is best effort: a failing display must never fail the request waiting for quota"""
+    try:
+        feedback(kind, position, depth)
+    except Exception:
+        pass
+
+
+class QuotaScheduler:
+    """Token bucket shared by every session, granting waiting requests round-robin across sessions"""
+
+    def __init__(self, kind, per_minute, burst, max_wait_seconds=120):
+        self.kind = kind
+        self.rate = per_minute / 60
+        self.burst = max(1, burst)
+        self.max_wait_seconds = max_wait_seconds
+        self.granted = 0
+        self.max_depth = 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._queues = OrderedDict()
+        self._waits = deque(maxlen=500)
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _position(self, session_id, ticket):
+        """1-based place in the round-robin grant order"""
+        index = self._queues[session_id].index(ticket)
+        ahead = 0
+        before_ours = True
+        for session, queue in self._queues.items():
+            if session == session_id:
+                before_ours = False
+                ahead += index
+            else:
+                # Sessions ahead of ours in the rotation also get a turn in the round that serves our ticket
+                ahead += min(len(queue), index + (1 if before_ours else 0))
+        return ahead + 1
+
+    def acquire(self, session_id=None):
+        """Block until this session's turn comes up and a token is free; returns the seconds waited"""
+        if self.rate <= 0:
+            return 0.0
+        session_id = session_id or _session.get()
+        feedback = _feedback.get()
+        ticket = object()
+        start = time.monotonic()
+        reported = None
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            self.max_depth = max(self.max_depth, self._depth())
+        try:
+            while True:
+                with self._cond:
+                    self._refill()
+                    head_session, head_queue = next(iter(self._queues.items()))
+                    if head_queue[0] is ticket and self._tokens >= 1:
+                        self._tokens -= 1
+                        head_queue.popleft()
+                        # Served sessions go to the back so every waiting session gets a turn
+                        del self._queues[head_session]
+                        if head_queue:
+                            self._queues[head_session] = head_queue
+                        waited = time.monotonic() - start
+                        self._waits.append(waited)
+                        self.granted += 1
+                        self._cond.notify_all()
+                        break
+                    if time.monotonic() - start > self.max_wait_seconds:
+                        raise QuotaTimeout(f"waited over {self.max_wait_seconds}s for {self.kind} quota")
+                    position, depth = self._position(session_id, ticket), self._depth()
+                    wait_for = max(0.01, (1 - self._tokens) / self.rate) if self._tokens < 1 else 0.25
+                if feedback is not None and position != reported:
+                    _notify(feedback, self.kind, position, depth)
+                    reported = position
+                with self._cond:
+                    self._cond.wait(min(wait_for, 0.25))
+        finally:
+            with self._cond:
+                queue = self._queues.get(session_id)
+                if queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._queues[session_id]
+                    self._cond.notify_all()
+            if feedback is not None and reported is not None:
+                _notify(feedback, self.kind, 0, 0)
+        return waited
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "depth": self._depth(),
+                "max_depth": self.max_depth,
+                "granted": self.granted,
+                "p50_wait_seconds": percentile(waits, 0.50),
+                "p95_wait_seconds": percentile(waits, 0.95),
+            }
+
+
+def get_scheduler(kind):
+    """Return the process-wide scheduler for the inference or search budget, configured on first use"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(kind)
+        if scheduler is None:
+            per_minute, burst = QUOTA_DEFAULTS[kind]
+            scheduler = QuotaScheduler(
+                kind,
+                per_minute=float(os.getenv(f"QUOTA_{kind.upper()}_PER_MINUTE", str(per_minute))),
+                burst=int(os.getenv(f"QUOTA_{kind.upper()}_BURST", str(burst))),
+                max_wait_seconds=float(os.getenv("QUOTA_MAX_WAIT_SECONDS", "120")),
+            )
+            _schedulers[kind] = scheduler
+        return scheduler
+
+
+def all_scheduler_stats():
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return {scheduler.kind: scheduler.stats() for scheduler in schedulers}
@@ -0,0 +1,106 @@
+import math
+import re
+from collections import Counter
+from urllib.parse import urlsplit
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return _TOKEN_PATTERN.findall((text or "").lower())
+
+
+def extract_snippets(results):
+    """Flatten a SerpAPI results() payload into {title, link, snippet} records"""
+    snippets = []
+    answer_box = results.get("answer_box") or {}
+    if answer_box.get("snippet") or answer_box.get("answer"):
+        snippets.append({
+            "title": answer_box.get("title", ""),
+            "link": answer_box.get("link", ""),
+            "snippet": answer_box.get("snippet") or answer_box.get("answer"),
+        })
+    for item in results.get("organic_results") or []:
+        if item.get("snippet"):
+            snippets.append({"title": item.get("title", ""), "link": item.get("link", ""), "snippet": item["snippet"]})
+    local_results = results.get("local_results") or {}
+    places = local_results.get("places", []) if isinstance(local_results, dict) else local_results
+    for place in places:
+        details = ", ".join(str(place[k]) for k in ("type", "rating", "price", "address") if place.get(k))
+        if place.get("title"):
+            snippets.append({"title": place["title"], "link": place.get("website", ""), "snippet": details})
+    return snippets
+
+
+def _canonical_url(link):
+    if not link:
+        return None
+    parts = urlsplit(link.lower())
+    return parts.netloc.removeprefix("www.") + parts.path.rstrip("/")
+
+
+def _shingles(text, size=3):
+    words = tokenize(text)
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def dedupe_snippets(snippets, threshold=0.8):
+    """Drop snippets whose URL was already seen or whose text is a near-duplicate (shingle Jaccard)"""
+    kept = []
+    seen_urls = set()
+    kept_shingles = []
+    for snippet in snippets:
+        url = _canonical_url(snippet.get("link"))
+        if url and url in seen_urls:
+            continue
+        shingles = _shingles(f"{snippet.get('title', '')} {snippet.get('snippet', '')}")
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles if shingles | other):
+            continue
+        if url:
+            seen_urls.add(url)
+        kept_shingles.append(shingles)
+        kept.append(snippet)
+    return kept
+
+
+class BM25:
+    """Okapi BM25 over a small in-memory corpus"""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = [Counter(tokenize(d)) for d in documents]
+        self.lengths = [sum(d.values()) for d in self.docs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+        doc_freq = Counter(term for d in self.docs for term in d)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def scores(self, query):
+        terms = tokenize(query)
+        scores = []
+        for doc, length in zip(self.docs, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in terms:
+                tf = doc.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+
+def rank_snippets(snippets, query, top_k=12):
+    """Return the top_k snippets by BM25 score against the query, best first"""
+    if not snippets:
+        return []
+    index = BM25([f"{s.get('title', '')} {s.get('snippet', '')}" for s in snippets])
+    ranked = sorted(zip(index.scores(query), range(len(snippets))), key=lambda pair: (-pair[0], pair[1]))
+    return [snippets[i] for _, i in ranked[:top_k]]
+
+
+def format_snippets(snippets):
+    return "\n".join(
+        f"- {s.get('title', '')}: {s.get('snippet', '')}" + (f" ({s['link']})" if s.get("link") else "")
+        for s in snippets
+    )
@@ -0,0 +1,343 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+from prompts import build_prompt
+from quota import as_completed_showing_quota
+from research_sections import count_tokens
+from response_cache import cached_invoke, make_cache_key
+
+
+class RecommendationOption(BaseModel):
+    """One recommended hotel, activity, restaurant or transport option"""
+
+    name: str = Field(description="Name of the hotel, activity, restaurant or transport service")
+    price_inr: int = Field(ge=0, description="Price in Indian Rupees as a plain number")
+    price_unit: str = Field(description="What the price covers, e.g. 'per night', 'per person', 'per meal', 'per day'")
+    area: str = Field(description="Area, neighbourhood or coverage")
+    reason: str = Field(description="Why it fits the user's preference, in one sentence")
+    details: Optional[str] = Field(default=None, description="Short description, cuisine or booking tip")
+
+    def label(self):
+        return f"{self.name} – ₹{self.price_inr:,} {self.price_unit} – {self.area}"
+
+
+class RecommendationOptions(BaseModel):
+    """Exactly the options shown to the user for one preference category"""
+
+    options: List[RecommendationOption] = Field(min_length=1, max_length=3)
+
+
+class BatchedRecommendations(BaseModel):
+    """Options for every requested preference category in a single response"""
+
+    accommodation: Optional[RecommendationOptions] = Field(default=None, description="Accommodation recommendations, if requested")
+    activity: Optional[RecommendationOptions] = Field(default=None, description="Activity recommendations, if requested")
+    dining: Optional[RecommendationOptions] = Field(default=None, description="Restaurant/dining recommendations, if requested")
+    transport: Optional[RecommendationOptions] = Field(default=None, description="Transportation recommendations, if requested")
+
+
+BATCH_CATEGORY_LABELS = {
+    "accommodation": "accommodation",
+    "activity": "activity",
+    "dining": "restaurant/dining",
+    "transport": "transportation",
+}
+
+
+# Per-category instructions; {preference} is the selected option and {destination} the trip destination
+RECOMMENDATION_INSTRUCTIONS = {
+    "accommodation": """
+Based on the research results and user preference for {preference} in {destination},
+provide exactly 3 specific accommodation recommendations in this format:
+
+**Option 1: [Hotel Name]**
+- Description: [Brief description and key features]
+- Price: ₹[amount] per night
+- Location: [area/location]
+- Why recommended: [reason it fits preference]
+
+**Option 2: [Hotel Name]**
+- Description: [Brief description and key features]
+- Price: ₹[amount] per night
+- Location: [area/location]
+- Why recommended: [reason it fits preference]
+
+**Option 3: [Hotel Name]**
+- Description: [Brief description and key features]
+- Price: ₹[amount] per night
+- Location: [area/location]
+- Why recommended: [reason it fits preference]
+""",
+    "activity": """
+Based on the research results and user preference for {preference} in {destination},
+provide exactly 3 specific activity recommendations in this format:
+
+**Option 1: [Activity Name]**
+- Description: [What to expect and details]
+- Cost: ₹[amount] per person
+- Duration: [time needed]
+- Why recommended: [reason it fits preference]
+
+**Option 2: [Activity Name]**
+- Description: [What to expect and details]
+- Cost: ₹[amount] per person
+- Duration: [time needed]
+- Why recommended: [reason it fits preference]
+
+**Option 3: [Activity Name]**
+- Description: [What to expect and details]
+- Cost: ₹[amount] per person
+- Duration: [time needed]
+- Why recommended: [reason it fits preference]
+""",
+    "dining": """
+Based on the research results and user preference for {preference} in {destination},
+provide exactly 3 specific restaurant/dining recommendations in this format:
+
+**Option 1: [Restaurant Name]**
+- Cuisine: [Type of cuisine]
+- Specialties: [Signature dishes]
+- Cost: ₹[amount] per person per meal
+- Location: [area/address]
+- Why recommended: [reason it fits preference]
+
+**Option 2: [Restaurant Name]**
+- Cuisine: [Type of cuisine]
+- Specialties: [Signature dishes]
+- Cost: ₹[amount] per person per meal
+- Location: [area/address]
+- Why recommended: [reason it fits preference]
+
+**Option 3: [Restaurant Name]**
+- Cuisine: [Type of cuisine]
+- Specialties: [Signature dishes]
+- Cost: ₹[amount] per person per meal
+- Location: [area/address]
+- Why recommended: [reason it fits preference]
+""",
+    "transport": """
+Based on the research results and user preference for {preference} in {destination},
+provide exactly 3 specific transportation recommendations in this format:
+
+**Option 1: [Service Name/Type]**
+- Description: [Service details and availability]
+- Cost: ₹[amount] per day/trip
+- Coverage: [Areas served and convenience]
+- Booking: [How to book and tips]
+- Why recommended: [reason it fits preference]
+
+**Option 2: [Service Name/Type]**
+- Description: [Service details and availability]
+- Cost: ₹[amount] per day/trip
+- Coverage: [Areas served and convenience]
+- Booking: [How to book and tips]
+- Why recommended: [reason it fits preference]
+
+**Option 3: [Service Name/Type]**
+- Description: [Service details and availability]
+- Cost: ₹[amount] per day/trip
+- Coverage: [Areas served and convenience]
+- Booking: [How to book and tips]
+- Why recommended: [reason it fits preference]
+""",
+}
+
+# Selections that skip the recommendation call for their category
+NO_RECOMMENDATION_PREFERENCES = {"No Preference", "Mix of Everything"}
+# What the preference page starts with selected
+DEFAULT_PREFERENCES = {
+    "accommodation": "Mid-range Hotels (₹4,000-15,000 per night)",
+    "activity": "Mix of Everything",
+    "dining": "Mix of Both (₹800-4,000 per meal)",
+    "transport": "Public Transport (₹50-500 per day)",
+}
+
+
+def recommendation_prompt(trip_data, category, preference, research_context):
+    return build_prompt(
+        trip_data,
+        research_context,
+        RECOMMENDATION_INSTRUCTIONS[category].format(preference=preference, destination=trip_data["destination"]),
+    )
+
+
+def format_options_markdown(recommendations):
+    """Render structured options in the same shape as the markdown prompts ask for"""
+    blocks = []
+    for i, option in enumerate(recommendations.options, start=1):
+        lines = [f"**Option {i}: {option.name}**"]
+        if option.details:
+            lines.append(f"- Description: {option.details}")
+        lines.append(f"- Price: ₹{option.price_inr:,} {option.price_unit}")
+        lines.append(f"- Location: {option.area}")
+        lines.append(f"- Why recommended: {option.reason}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def cached_structured_invoke(cache, llm, prompt, research=None, policy=None):
+    """Invoke the LLM with the RecommendationOptions schema, caching the validated records as compact JSON
+
+    Returns (recommendations, cache hit), as cached_invoke does.
+    """
+    key = make_cache_key(f"{getattr(llm, 'model_name', '')}:structured", prompt, research)
+    cached = cache.get(key)
+    if cached is not None:
+        try:
+            return RecommendationOptions.model_validate_json(cached), True
+        except ValidationError:
+            pass
+    # Tool calling is the structured-output method the GitHub Models endpoint supports most broadly
+    structured_llm = llm.with_structured_output(RecommendationOptions, method="function_calling")
+    recommendations = policy.call(structured_llm.invoke, prompt) if policy else structured_llm.invoke(prompt)
+    if recommendations is None:
+        from langchain_core.exceptions import OutputParserException
+        raise OutputParserException("the answer has no RecommendationOptions tool call")
+    cache.set(key, recommendations.model_dump_json(exclude_none=True))
+    return recommendations, False
+
+
+def build_batched_prompt(trip_data, preferences, research_context):
+    """One prompt asking for every selected category, sharing the language, trip facts and research"""
+    requests = "\n    ".join(
+        f"- {category}: exactly 3 specific {BATCH_CATEGORY_LABELS[category]} recommendations for the user's preference for {preference}"
+        for category, preference in preferences.items()
+    )
+    return build_prompt(trip_data, research_context, f"""
+    Based on the research results, provide recommendations for a trip to {trip_data['destination']}.
+    Fill only the fields for the categories listed below, each with exactly 3 options:
+    {requests}
+    
+    For each option give its name, price in INR as a number with what the price covers
+    (per night, per person, per meal or per day/trip), its area or location, a short description,
+    and why it fits the preference.
+    """)
+
+
+def batched_recommendations(cache, llm, batched_prompt, prompts, research=None, max_workers=4, policy=None, usage=None):
+    """Ask for all categories in one structured call, yielding (category, content, error) like fan_out_recommendations
+
+    Categories missing from the batched answer, or all of them if it cannot be parsed,
+    fall back to one structured call per category. Any other failure is reported for every category.
+    """
+    if not prompts:
+        return
+    usage = usage if usage is not None else {}
+    key = make_cache_key(f"{getattr(llm, 'model_name', '')}:batched", batched_prompt, research)
+    batch = None
+    cached = cache.get(key)
+    if cached is not None:
+        try:
+            batch = BatchedRecommendations.model_validate_json(cached)
+        except ValidationError:
+            batch = None
+    if batch is None:
+        # Only calls that reach the model count as requests, not cache hits
+        _count_request(usage, batched_prompt)
+        structured_llm = llm.with_structured_output(BatchedRecommendations, method="function_calling")
+        try:
+            batch = policy.call(structured_llm.invoke, batched_prompt) if policy else structured_llm.invoke(batched_prompt)
+        except Exception as e:
+            # A deadline overrun or quota timeout has already spent the stage's budget, so no fan-out follows it
+            if not _is_parse_error(e):
+                for category in prompts:
+                    yield category, None, e
+                return
+            batch = None
+        if batch is not None:
+            cache.set(key, batch.model_dump_json(exclude_none=True))
+
+    remaining = {}
+    for category, prompt in prompts.items():
+        content = getattr(batch, category, None) if batch is not None else None
+        if content is None:
+            remaining[category] = prompt
+        else:
+            yield category, content, None
+    if remaining:
+        usage["fallback_categories"] = sorted(remaining)
+        yield from fan_out_recommendations(
+            cache, llm, remaining, research, max_workers=max_workers, structured=True, policy=policy, usage=usage
+        )
+
+
+def _is_parse_error(error):
+    """Whether a structured call failed because its answer didn't fit the schema, not because the call itself failed"""
+    if isinstance(error, ValidationError):
+        return True
+    # Only reached once a structured call has failed, so LangChain is loaded by then
+    from langchain_core.exceptions import OutputParserException
+    return isinstance(error, OutputParserException)
+
+
+def _count_request(usage, prompt):
+    usage["requests"] = usage.get("requests", 0) + 1
+    usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + count_tokens(prompt)
+
+
+def _invoke_recommendation(cache, llm, prompt, research, structured, policy):
+    """(content, cache hit) for one category"""
+    if structured:
+        try:
+            return cached_structured_invoke(cache, llm, prompt, research, policy)
+        except Exception as e:
+            # Only an answer that doesn't fit the schema falls back to markdown; deadlines, quota waits
+            # and exhausted retries already spent this stage's budget
+            if not _is_parse_error(e):
+                raise
+    return cached_invoke(cache, llm, prompt, research, policy)
+
+
+def fan_out_recommendations(cache, llm, prompts, research=None, max_workers=4, structured=False, policy=None, usage=None):
+    """Issue all recommendation prompts at once and yield (category, content, error) as each completes
+
+    content is RecommendationOptions in structured mode, or markdown text otherwise.
+    """
+    if not prompts:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompts)))) as pool:
+        futures = {
+            pool.submit(
+                contextvars.copy_context().run, _invoke_recommendation, cache, llm, prompt, research, structured, policy
+            ): category
+            for category, prompt in prompts.items()
+        }
+        for future in as_completed_showing_quota(futures):
+            category = futures[future]
+            try:
+                (content, hit), error = future.result(), None
+            except Exception as e:
+                content, hit, error = None, False, e
+            if usage is not None and not hit:
+                _count_request(usage, prompts[category])
+            yield category, content, error
+
+
+def run_recommendations(cache, llm, trip_data, preferences, prompts, research_slices, research, policy=None, usage=None):
+    """Recommend options for each {category: preference} in the configured RECOMMENDATION_MODE
+
+    prompts holds each category's recommendation_prompt(); yields (category, content, error) as fan_out_recommendations does.
+    """
+    max_workers = int(os.getenv("RECOMMENDATION_WORKERS", "4"))
+    if os.getenv("RECOMMENDATION_MODE", "fanout") == "batched":
+        # One structured call for every category, sharing the research slices they need
+        batched_prompt = build_batched_prompt(
+            trip_data, preferences, "\n\n".join(dict.fromkeys(research_slices[category] for category in preferences))
+        )
+        return batched_recommendations(
+            cache, llm, batched_prompt, prompts, research, max_workers=max_workers, policy=policy, usage=usage
+        )
+    return fan_out_recommendations(
+        cache,
+        llm,
+        prompts,
+        research,
+        max_workers=max_workers,
+        structured=os.getenv("RECOMMENDATION_FORMAT", "structured") == "structured",
+        policy=policy,
+        usage=usage,
+    )
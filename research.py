@@ -0,0 +1,480 @@
+import contextvars
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from textwrap import dedent
+from typing import List
+
+from langchain.agents import initialize_agent, Tool
+from langchain.agents.agent_types import AgentType
+from langchain.agents.mrkl.output_parser import FINAL_ANSWER_ACTION, MRKLOutputParser
+from langchain.memory import ConversationBufferMemory, ConversationSummaryBufferMemory
+from langchain_core.agents import AgentFinish
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field, ValidationError
+
+from call_policy import attempt_checkpoint
+from ranking import dedupe_snippets, extract_snippets, format_snippets, rank_snippets
+from research_sections import count_tokens, from_first_section, research_complete
+
+# pipeline: one call for search terms, concurrent searches, one synthesis call; agent: the ReAct researcher;
+# tools: the same researcher using native tool calls, with several searches per turn
+RESEARCH_MODES = ("pipeline", "agent", "tools")
+SEARCH_TOOL_DESCRIPTION = "Searches for travel info related to destinations and activities."
+# What AgentExecutor returns in place of an answer when it runs out of iterations
+ITERATION_LIMIT_OUTPUT = "Agent stopped due to iteration limit or time limit."
+# buffer: unbounded history; window: most recent turns within the token ceiling; summary: older turns rolled into a summary
+MEMORY_MODES = ("buffer", "window", "summary")
+
+
+def research_format(budget):
+    return dedent(
+        f"""
+        **ACCOMMODATIONS OPTIONS:**
+        - Option 1: [Name] - [Brief description] - [Price range in INR within ₹{budget} total budget]
+        - Option 2: [Name] - [Brief description] - [Price range in INR within ₹{budget} total budget]
+        - Option 3: [Name] - [Brief description] - [Price range in INR within ₹{budget} total budget]
+
+        **ACTIVITY OPTIONS:**
+        - Option 1: [Activity] - [Description] - [Duration/Time needed] - [Cost in INR]
+        - Option 2: [Activity] - [Description] - [Duration/Time needed] - [Cost in INR]
+        - Option 3: [Activity] - [Description] - [Duration/Time needed] - [Cost in INR]
+
+        **DINING OPTIONS:**
+        - Option 1: [Restaurant/Food] - [Cuisine type] - [Price range in INR]
+        - Option 2: [Restaurant/Food] - [Cuisine type] - [Price range in INR]
+        - Option 3: [Restaurant/Food] - [Cuisine type] - [Price range in INR]
+        """
+    ).strip()
+
+
+def researcher_prompt(trip_data):
+    """The ReAct researcher's task, followed by the trip facts it works from"""
+    destination, num_days, budget, language = (
+        trip_data["destination"], trip_data["num_days"], trip_data["budget"], trip_data["language"]
+    )
+    prompt = dedent(
+        f"""
+        CRITICAL: Respond ONLY in {language} language. All research findings must be presented in {language}.
+
+        You are a world-class travel researcher. Given a travel destination and the number of days the user wants to travel for,
+        generate a list of 3 search terms for relevant travel activities and accommodations.
+        Then search the web for each term, analyze the results, and return the most relevant results.
+        The user has a ₹{budget} INR budget and prefers the itinerary in {language}.
+
+        Generate 3 search terms related to the destination and days.
+        For each, use `search_google` to fetch results and analyze.
+        Return 10 most relevant insights aligned with user's preferences.
+        Maintain high quality and relevance.
+
+        Present your findings in this format:
+
+        {{format}}
+
+        The user has a total budget of ₹{budget} INR for {num_days} days and prefers information in {language}.
+        REMEMBER: Write ALL content in {language}, not English or any other language.
+        """
+    ).replace("{format}", research_format(budget))
+    return prompt + f"\nDestination: {destination}\nDays: {num_days}\nBudget: {budget}\nLanguage: {language}"
+
+
+def trip_query(trip_data):
+    """What search snippets are ranked against: the trip facts plus the three research topics"""
+    return (
+        f"{trip_data['destination']} {trip_data['num_days']} days budget {trip_data['budget']} INR "
+        "hotels accommodation stay things to do activities attractions restaurants food dining price"
+    )
+
+
+def ranking_enabled():
+    return os.getenv("RESEARCH_RANKING", "bm25") == "bm25"
+
+
+def early_stop_enabled():
+    return os.getenv("RESEARCH_EARLY_STOP", "1") == "1"
+
+
+def ranked_search(search, query, trip_data, top_k):
+    """Structured results for one query, deduplicated and BM25-ranked, formatted for the LLM"""
+    snippets = extract_snippets(search.results(query))
+    if not snippets:
+        # What SerpAPIWrapper.run says for an empty payload, without paying for the same query twice
+        return "No good search result found"
+    return format_snippets(rank_snippets(dedupe_snippets(snippets), f"{query} {trip_query(trip_data)}", top_k))
+
+
+class PromptSizeRecorder(BaseCallbackHandler):
+    """Record the prompt size in tokens of every LLM call the agent makes"""
+
+    def __init__(self):
+        self.step_prompt_tokens = []
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.step_prompt_tokens.append(sum(count_tokens(p) for p in prompts))
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.step_prompt_tokens.append(sum(count_tokens(str(m.content)) for batch in messages for m in batch))
+
+
+class CheckpointHandler(BaseCallbackHandler):
+    """Run a checkpoint before every model call and search the agent makes, so it can be stopped between steps"""
+
+    raise_error = True
+
+    def __init__(self, checkpoint):
+        self.checkpoint = checkpoint
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.checkpoint()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.checkpoint()
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.checkpoint()
+
+
+class SectionAwareOutputParser(MRKLOutputParser):
+    """ReAct output parser that finishes as soon as a step already contains all three research sections
+
+    Without it, a step that writes the sections but no "Final Answer:" is a parse error and costs another round trip.
+    """
+
+    def parse(self, text):
+        if FINAL_ANSWER_ACTION not in text and research_complete(text):
+            body = re.split(r"\n\s*(?:Action\s*\d*\s*:|Observation:|Thought:)", from_first_section(text))[0].strip()
+            return AgentFinish({"output": body, "stop_reason": "sections_complete"}, text)
+        return super().parse(text)
+
+
+def agent_step_metrics(result):
+    """Stop reason, parse-error retries and wasted iterations of one research agent run"""
+    steps = result.get("intermediate_steps", [])
+    parse_errors = sum(1 for action, _ in steps if action.tool == "_Exception")
+    searches = [str(action.tool_input).strip().lower() for action, _ in steps if action.tool != "_Exception"]
+    repeated_searches = len(searches) - len(set(searches))
+    if result.get("stop_reason"):
+        stop_reason = result["stop_reason"]
+    elif result["output"] == ITERATION_LIMIT_OUTPUT:
+        stop_reason = "max_iterations"
+    else:
+        stop_reason = "final_answer"
+    return {
+        "stop_reason": stop_reason,
+        "parse_errors": parse_errors,
+        # Round trips that added nothing: malformed steps and searches already made
+        "wasted_iterations": parse_errors + repeated_searches,
+    }
+
+
+def _messages_tokens(messages):
+    return sum(count_tokens(str(m.content)) for m in messages)
+
+
+class TokenWindowMemory(ConversationBufferMemory):
+    """Buffer memory that drops the oldest messages once the history passes max_token_limit"""
+
+    max_token_limit: int = 2000
+
+    def save_context(self, inputs, outputs):
+        super().save_context(inputs, outputs)
+        messages = self.chat_memory.messages
+        while len(messages) > 1 and _messages_tokens(messages) > self.max_token_limit:
+            messages.pop(0)
+
+
+class RollingSummaryMemory(ConversationSummaryBufferMemory):
+    """Summary buffer memory that counts tokens locally instead of through the model's tokenizer"""
+
+    def prune(self):
+        messages = self.chat_memory.messages
+        pruned = []
+        while len(messages) > 1 and _messages_tokens(messages) > self.max_token_limit:
+            pruned.append(messages.pop(0))
+        if pruned:
+            self.moving_summary_buffer = self.predict_new_summary(pruned, self.moving_summary_buffer)
+
+
+def build_research_memory(llm, mode, max_tokens):
+    if mode not in MEMORY_MODES:
+        raise ValueError(f"RESEARCH_MEMORY must be one of {', '.join(MEMORY_MODES)}, got {mode!r}")
+    common = {"memory_key": "chat_history", "return_messages": True, "output_key": "output"}
+    if mode == "window":
+        return TokenWindowMemory(max_token_limit=max_tokens, **common)
+    if mode == "summary":
+        return RollingSummaryMemory(llm=llm, max_token_limit=max_tokens, **common)
+    return ConversationBufferMemory(**common)
+
+
+def scratchpad_trimmer(max_tokens):
+    """Keep only the most recent agent steps whose observations fit in max_tokens (always at least one)"""
+    def trim(steps):
+        kept = []
+        used = 0
+        for action, observation in reversed(steps):
+            used += count_tokens(str(observation)) + count_tokens(action.log)
+            if kept and used > max_tokens:
+                break
+            kept.append((action, observation))
+        return list(reversed(kept))
+    return trim
+
+
+def search_tool_func(search, trip_data=None):
+    """What search_google runs: ranked snippets when ranking is on, else SerpAPI's flattened text"""
+    if trip_data is not None and ranking_enabled():
+        top_k = int(os.getenv("RESEARCH_TOP_K", "12"))
+        return lambda query: ranked_search(search, query, trip_data, top_k)
+    return search.run
+
+
+def build_research_agent(llm, search, trip_data=None):
+    """ReAct agent with the search_google tool, as the researcher has always been set up"""
+    search_tool = Tool(
+        name="search_google",
+        func=search_tool_func(search, trip_data),
+        description=SEARCH_TOOL_DESCRIPTION,
+    )
+    memory_mode = os.getenv("RESEARCH_MEMORY", "window")
+    max_tokens = int(os.getenv("RESEARCH_MEMORY_TOKENS", "2000"))
+    memory = build_research_memory(llm, memory_mode, max_tokens)
+    # The scratchpad of thoughts and observations is what grows with each step, so it gets the same ceiling
+    trim_steps = {} if memory_mode == "buffer" else {"trim_intermediate_steps": scratchpad_trimmer(max_tokens)}
+    early_stop = {"agent_kwargs": {"output_parser": SectionAwareOutputParser()}} if early_stop_enabled() else {}
+    return initialize_agent(
+        tools=[search_tool],
+        llm=llm,
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=False,
+        memory=memory,
+        max_iterations=3,
+        handle_parsing_errors=True,
+        return_intermediate_steps=True,
+        **trim_steps,
+        **early_stop,
+    )
+
+
+def _no_checkpoint():
+    pass
+
+
+def _with_deadline(checkpoint):
+    """The caller's checkpoint, plus stopping once a call policy has given up waiting for this research"""
+    def check():
+        attempt_checkpoint()
+        checkpoint()
+    return check
+
+
+def run_agent_research(llm, search, trip_data, checkpoint=_no_checkpoint):
+    start = time.perf_counter()
+    researcher = build_research_agent(llm, search, trip_data)
+    recorder = PromptSizeRecorder()
+    result = researcher.invoke(
+        {"input": researcher_prompt(trip_data)}, config={"callbacks": [recorder, CheckpointHandler(checkpoint)]}
+    )
+    steps = result.get("intermediate_steps", [])
+    return result["output"], {
+        "mode": "agent",
+        "iterations": len(steps),
+        "step_prompt_tokens": recorder.step_prompt_tokens,
+        "result_tokens": sum(count_tokens(str(observation)) for action, observation in steps if action.tool != "_Exception"),
+        **agent_step_metrics(result),
+        "model_calls": len(recorder.step_prompt_tokens),
+        "tool_calls": sum(1 for action, _ in steps if action.tool != "_Exception"),
+        "total_seconds": time.perf_counter() - start,
+    }
+
+
+class SearchQuery(BaseModel):
+    query: str = Field(description="Google search query")
+
+
+def _run_tool_call(func, call):
+    try:
+        return str(func(call["args"]["query"]))
+    except Exception as e:
+        return f"(search failed: {e})"
+
+
+def run_tool_agent_research(llm, search, trip_data, max_iterations=3, max_workers=3, checkpoint=_no_checkpoint):
+    """The researcher with native tool calling; searches requested in the same turn run concurrently"""
+    start = time.perf_counter()
+    func = search_tool_func(search, trip_data)
+    search_tool = StructuredTool.from_function(
+        func=func, name="search_google", description=SEARCH_TOOL_DESCRIPTION, args_schema=SearchQuery
+    )
+    searching_llm = llm.bind_tools([search_tool])
+    # The last turn may not search again, so the run always ends with findings
+    answering_llm = llm.bind_tools([search_tool], tool_choice="none")
+    recorder = PromptSizeRecorder()
+    messages = [HumanMessage(
+        researcher_prompt(trip_data)
+        + "\n\nCall search_google for all of your search terms in the same turn, then present your findings."
+    )]
+    metrics = {"mode": "tools", "iterations": 0, "tool_calls": 0, "parse_errors": 0, "wasted_iterations": 0}
+    output, stop_reason = "", "max_iterations"
+    searches = set()
+    for turn in range(max_iterations):
+        checkpoint()
+        model = answering_llm if turn == max_iterations - 1 else searching_llm
+        response = model.invoke(messages, config={"callbacks": [recorder]})
+        messages.append(response)
+        if early_stop_enabled() and research_complete(str(response.content)):
+            output, stop_reason = from_first_section(str(response.content)), "sections_complete"
+            break
+        if not response.tool_calls:
+            output, stop_reason = str(response.content), "final_answer"
+            break
+        metrics["iterations"] += 1
+        metrics["tool_calls"] += len(response.tool_calls)
+        for call in response.tool_calls:
+            query = str(call["args"].get("query", "")).strip().lower()
+            metrics["wasted_iterations"] += query in searches
+            searches.add(query)
+        checkpoint()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(response.tool_calls)))) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, _run_tool_call, func, call) for call in response.tool_calls
+            ]
+            messages.extend(
+                ToolMessage(content=future.result(), tool_call_id=call["id"])
+                for call, future in zip(response.tool_calls, futures)
+            )
+    metrics.update(
+        stop_reason=stop_reason,
+        step_prompt_tokens=recorder.step_prompt_tokens,
+        model_calls=len(recorder.step_prompt_tokens),
+        result_tokens=sum(count_tokens(str(m.content)) for m in messages if isinstance(m, ToolMessage)),
+        total_seconds=time.perf_counter() - start,
+    )
+    return output, metrics
+
+
+class SearchTerms(BaseModel):
+    """Web search queries for researching a trip"""
+
+    # No upper bound: a model that returns a fourth query shouldn't fail the research, the extras are dropped
+    terms: List[str] = Field(min_length=1, description="Exactly 3 distinct Google search queries")
+
+
+def search_terms_prompt(trip_data):
+    return dedent(
+        f"""
+        You are a world-class travel researcher. Generate exactly 3 Google search queries that will find
+        relevant accommodations, activities and dining for a {trip_data['num_days']}-day trip to
+        {trip_data['destination']} on a total budget of ₹{trip_data['budget']} INR.
+        Write the queries in English so they return the widest range of results.
+        """
+    ).strip()
+
+
+def default_search_terms(trip_data):
+    """Fallback queries for when the model returns no search terms"""
+    destination = trip_data["destination"]
+    return [
+        f"best hotels in {destination}",
+        f"top things to do in {destination} in {trip_data['num_days']} days",
+        f"best restaurants in {destination}",
+    ]
+
+
+def synthesis_prompt(trip_data, results):
+    language, budget = trip_data["language"], trip_data["budget"]
+    return dedent(
+        f"""
+        CRITICAL: Respond ONLY in {language} language. All research findings must be presented in {language}.
+
+        You are a world-class travel researcher. Using only the web search results below, return the
+        most relevant insights for a {trip_data['num_days']}-day trip to {trip_data['destination']}
+        with a total budget of ₹{budget} INR. Do not fabricate names or prices.
+
+        Present your findings in this format:
+
+        {{format}}
+
+        WEB SEARCH RESULTS:
+        {{results}}
+
+        REMEMBER: Write ALL content in {language}, not English or any other language.
+        """
+    ).strip().replace("{format}", research_format(budget)).replace("{results}", results)
+
+
+def _safe_search(search, term, method="run"):
+    """(result, whether the search failed); a failed search still leaves a result the synthesis can read"""
+    try:
+        return getattr(search, method)(term), False
+    except Exception as e:
+        return (f"(search failed: {e})" if method == "run" else {}), True
+
+
+def run_pipeline_research(llm, search, trip_data, max_workers=3, checkpoint=_no_checkpoint):
+    """Plan search terms in one call, run every search concurrently, then synthesize once"""
+    metrics = {"mode": "pipeline"}
+    start = time.perf_counter()
+
+    checkpoint()
+
+    terms_llm = llm.with_structured_output(SearchTerms, method="function_calling")
+    try:
+        planned = terms_llm.invoke(search_terms_prompt(trip_data))
+    except (OutputParserException, ValidationError):
+        planned = None
+    terms = list(dict.fromkeys(planned.terms))[:3] if planned is not None else default_search_terms(trip_data)
+    metrics["default_search_terms"] = planned is None
+    metrics["search_terms"] = terms
+    metrics["terms_seconds"] = time.perf_counter() - start
+
+    checkpoint()
+    phase_start = time.perf_counter()
+    method = "results" if ranking_enabled() else "run"
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(terms)))) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, _safe_search, search, term, method) for term in terms]
+        outcomes = [future.result() for future in futures]
+    payloads = {term: payload for term, (payload, _) in zip(terms, outcomes)}
+    metrics["failed_searches"] = sum(failed for _, failed in outcomes)
+    if method == "results":
+        # Only the best deduplicated snippets across all searches go into the synthesis prompt
+        snippets = [snippet for payload in payloads.values() for snippet in extract_snippets(payload)]
+        unique = dedupe_snippets(snippets)
+        selected = rank_snippets(unique, trip_query(trip_data), int(os.getenv("RESEARCH_TOP_K", "12")))
+        results = format_snippets(selected)
+        metrics["snippets"] = {"raw": len(snippets), "unique": len(unique), "used": len(selected)}
+        metrics["empty_searches"] = sum(1 for payload in payloads.values() if not extract_snippets(payload))
+        metrics["raw_result_tokens"] = count_tokens(format_snippets(snippets))
+    else:
+        results = "\n\n".join(f"SEARCH: {term}\n{result}" for term, result in payloads.items())
+    metrics["result_tokens"] = count_tokens(results)
+    metrics["search_seconds"] = time.perf_counter() - phase_start
+
+    checkpoint()
+    phase_start = time.perf_counter()
+    final_prompt = synthesis_prompt(trip_data, results)
+    output = llm.invoke(final_prompt).content
+    metrics["model_calls"] = 2
+    metrics["prompt_tokens"] = count_tokens(search_terms_prompt(trip_data)) + count_tokens(final_prompt)
+    metrics["synthesis_seconds"] = time.perf_counter() - phase_start
+    metrics["total_seconds"] = time.perf_counter() - start
+    return output, metrics
+
+
+def run_research(llm, search, trip_data, mode=None, checkpoint=None):
+    """Research the trip with the configured RESEARCH_MODE, returning (research text, phase metrics)
+
+    checkpoint is called between model calls and searches; whatever it raises stops the research there.
+    """
+    checkpoint = _with_deadline(checkpoint or _no_checkpoint)
+    mode = mode or os.getenv("RESEARCH_MODE", "pipeline")
+    if mode not in RESEARCH_MODES:
+        raise ValueError(f"RESEARCH_MODE must be one of {', '.join(RESEARCH_MODES)}, got {mode!r}")
+    if mode == "agent":
+        return run_agent_research(llm, search, trip_data, checkpoint=checkpoint)
+    if mode == "tools":
+        return run_tool_agent_research(llm, search, trip_data, checkpoint=checkpoint)
+    return run_pipeline_research(llm, search, trip_data, checkpoint=checkpoint)
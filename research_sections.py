@@ -0,0 +1,144 @@
+import functools
+import os
+import re
+
+# Headings the researcher prompt asks for, mapped to the preference category that needs them
+SECTION_HEADINGS = {
+    "accommodation": "ACCOMMODATIONS OPTIONS",
+    "activity": "ACTIVITY OPTIONS",
+    "dining": "DINING OPTIONS",
+}
+
+_HEADING_PATTERN = re.compile(
+    r"^\s*\**\s*(" + "|".join(re.escape(h) for h in SECTION_HEADINGS.values()) + r")\s*:?\s*\**\s*:?\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    """tiktoken's encoding, loaded on the first token count rather than at import; None when unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken when available, else estimate at ~4 characters per token"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def trim_to_token_budget(text, token_budget):
+    """Cut text down to at most token_budget tokens, keeping whole lines where possible"""
+    if count_tokens(text) <= token_budget:
+        return text
+    kept = []
+    used = 0
+    for line in text.splitlines():
+        line_tokens = count_tokens(line + "\n")
+        if used + line_tokens > token_budget:
+            break
+        kept.append(line)
+        used += line_tokens
+    encoding = _encoding()
+    if not kept and encoding is not None:
+        return encoding.decode(encoding.encode(text)[:token_budget])
+    if not kept:
+        return text[: token_budget * 4]
+    return "\n".join(kept)
+
+
+def split_research_sections(research):
+    """Split researcher output on its **... OPTIONS:** headings into {category: section text}"""
+    headings = {v.upper(): k for k, v in SECTION_HEADINGS.items()}
+    matches = list(_HEADING_PATTERN.finditer(research or ""))
+    sections = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(research)
+        sections[headings[match.group(1).upper()]] = research[match.start():end].strip()
+    return sections
+
+
+def from_first_section(research):
+    """The text from the first section heading on, dropping any preamble before it"""
+    match = _HEADING_PATTERN.search(research or "")
+    return research[match.start():] if match else research
+
+
+def research_complete(research):
+    """True once every required section heading is present with at least one line under it"""
+    sections = split_research_sections(research)
+    return all(
+        len([line for line in sections.get(category, "").splitlines() if line.strip()]) > 1
+        for category in SECTION_HEADINGS
+    )
+
+
+def slice_research_for_prompts(research, categories, token_budget):
+    """Return ({category: research context}, {category: tokens saved}) for the given categories
+
+    Categories without their own section (e.g. transport) or whose heading is missing,
+    for instance because the researcher translated it, fall back to the full research text.
+    """
+    sections = split_research_sections(research)
+    full_tokens = count_tokens(research)
+    slices = {}
+    tokens_saved = {}
+    for category in categories:
+        context = trim_to_token_budget(sections.get(category, research or ""), token_budget)
+        slices[category] = context
+        tokens_saved[category] = full_tokens - count_tokens(context)
+    return slices, tokens_saved
+
+
+def research_for_prompts(research, categories):
+    """Return (slices, tokens saved, planner research) per RESEARCH_TOKEN_BUDGET, PLANNER_RESEARCH_TOKEN_BUDGET and RESEARCH_CONTEXT"""
+    slices, tokens_saved = slice_research_for_prompts(research, categories, int(os.getenv("RESEARCH_TOKEN_BUDGET", "800")))
+    planner_research = trim_to_token_budget(research, int(os.getenv("PLANNER_RESEARCH_TOKEN_BUDGET", "3000")))
+    if os.getenv("RESEARCH_CONTEXT", "sections") == "shared":
+        # Every prompt carries the same research so they all share one long cacheable prefix
+        slices = {category: planner_research for category in slices}
+        tokens_saved = {category: count_tokens(research) - count_tokens(planner_research) for category in slices}
+    return slices, tokens_saved, planner_research
+
+
+_AMOUNT = r"([\d,]+(?:\.\d+)?)"
+# "a-b", "a–b" or "a to b"; a spaced hyphen is the option's field separator, not a range
+_RANGE_TAIL = rf"(?:(?:-|\s*–\s*|\s+to\s+)(?:₹|\brs\.?\s*|\binr\s*)?\s*{_AMOUNT})?"
+_PRICE_PATTERN = re.compile(
+    rf"(?:₹|\brs\.?|\binr)\s*{_AMOUNT}{_RANGE_TAIL}|{_AMOUNT}{_RANGE_TAIL}\s*(?:inr|rupees|/-)", re.IGNORECASE
+)
+_NUMBER_PATTERN = re.compile(r"\d[\d,]*(?:\.\d+)?")
+# The research template asks for prices "within ₹{budget} total budget", which models often copy onto every line
+_BUDGET_CLAUSE = re.compile(r"\(?\s*\bwithin\b[^\n-]*?\btotal budget\b\s*\)?", re.IGNORECASE)
+
+
+def _line_prices(line):
+    line = _BUDGET_CLAUSE.sub("", line)
+    prices = [float(amount.replace(",", "")) for match in _PRICE_PATTERN.findall(line) for amount in match if amount.strip(",")]
+    if not prices:
+        # Untagged amounts, as in "- Option 1: Name - description - 2,500-4,000", are taken from the last field only
+        prices = [float(n.replace(",", "")) for n in _NUMBER_PATTERN.findall(line.split(" - ")[-1])]
+    return [p for p in prices if p >= 10]
+
+
+def section_price_ranges(research):
+    """{category: (lowest, highest)} INR amounts quoted in each section's options, for categories with any"""
+    ranges = {}
+    for category, section in split_research_sections(research).items():
+        prices = [
+            price
+            for line in section.splitlines()[1:]
+            if line.strip().startswith(("-", "*", "•"))
+            for price in _line_prices(line)
+        ]
+        if prices:
+            ranges[category] = (min(prices), max(prices))
+    return ranges
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from research_sections import research_complete
+
+DEFAULT_RESEARCH_STORE_PATH = os.path.join(".cache", "research_store.sqlite3")
+DEFAULT_RESEARCH_MAX_AGE_SECONDS = 3 * 24 * 3600
+
+# Upper bounds (inclusive) of each trip-length bucket in days
+DAYS_BUCKETS = (3, 7, 14, 30)
+# Upper bounds of each budget tier in INR per day; anything above the last is luxury
+BUDGET_TIERS = (("shoestring", 3000), ("budget", 8000), ("midrange", 20000))
+# A typical INR per-day spend inside each tier, for generating trips of a given tier
+TIER_DAILY_BUDGETS = {"shoestring": 2000, "budget": 5000, "midrange": 14000, "luxury": 40000}
+
+
+def canonical_destination(destination):
+    """Lowercase, accent-free destination without its region suffix, so "Goa, India" and "goa" match"""
+    name = unicodedata.normalize("NFKD", destination.split(",")[0])
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return re.sub(r"[\W_]+", " ", name).strip().lower()
+
+
+def days_bucket(num_days):
+    for upper in DAYS_BUCKETS:
+        if num_days <= upper:
+            return f"<={upper}"
+    return f">{DAYS_BUCKETS[-1]}"
+
+
+def budget_tier(budget, num_days):
+    per_day = budget / max(1, num_days)
+    for tier, upper in BUDGET_TIERS:
+        if per_day <= upper:
+            return tier
+    return "luxury"
+
+
+def tier_budget(tier, num_days):
+    """Total budget for a trip in the given tier, rounded to the planner's ₹5,000 steps"""
+    return max(5000, round(TIER_DAILY_BUDGETS[tier] * num_days / 5000) * 5000)
+
+
+def trip_fingerprint(trip_data):
+    """Hash of the trip facts that decide what the research says"""
+    payload = json.dumps([
+        canonical_destination(trip_data["destination"]),
+        days_bucket(trip_data["num_days"]),
+        budget_tier(trip_data["budget"], trip_data["num_days"]),
+        trip_data["language"].strip().lower(),
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResearchStore:
+    """Research results shared across sessions, looked up by trip fingerprint, backed by SQLite
+
+    Texts are stored once under their content hash, so fingerprints with identical research share a row.
+    """
+
+    def __init__(self, path=DEFAULT_RESEARCH_STORE_PATH, max_age_seconds=DEFAULT_RESEARCH_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS contents (hash TEXT PRIMARY KEY, text TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            "fingerprint TEXT PRIMARY KEY, content_hash TEXT NOT NULL, "
+            "metrics TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, trip_data):
+        """Return (research text, metrics of the run that produced it, age in seconds), or None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT c.text, f.metrics, f.created_at FROM fingerprints f "
+                "JOIN contents c ON c.hash = f.content_hash WHERE f.fingerprint = ?",
+                (trip_fingerprint(trip_data),),
+            ).fetchone()
+            if row is None or now - row[2] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0], json.loads(row[1]), now - row[2]
+
+    def put(self, trip_data, text, metrics=None):
+        now = time.time()
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO contents (hash, text) VALUES (?, ?)", (content_hash, text))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (fingerprint, content_hash, metrics, created_at) VALUES (?, ?, ?, ?)",
+                (trip_fingerprint(trip_data), content_hash, json.dumps(metrics or {}, default=str), now),
+            )
+            # Drop stale fingerprints, then any text no fingerprint points at any more
+            self._conn.execute("DELETE FROM fingerprints WHERE created_at < ?", (now - self.max_age_seconds,))
+            self._conn.execute("DELETE FROM contents WHERE hash NOT IN (SELECT content_hash FROM fingerprints)")
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM fingerprints")
+            self._conn.execute("DELETE FROM contents")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            fingerprints = self._conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+            contents = self._conn.execute("SELECT COUNT(*) FROM contents").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "fingerprints": fingerprints,
+            "contents": contents,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def worth_storing(text, metrics):
+    """Only complete research is shared: every section present, no iteration-limit stop, and searches that found something"""
+    if not text or not research_complete(text):
+        return False
+    if metrics.get("stop_reason") == "max_iterations":
+        return False
+    # A pipeline synthesis written without search results is the model's guesswork
+    if metrics.get("search_terms") and metrics.get("failed_searches", 0) >= len(metrics["search_terms"]):
+        return False
+    return metrics.get("snippets", {}).get("used") != 0
+
+
+def stored_research(store, llm, search, trip_data, policy=None, checkpoint=None):
+    """Serve research for a matching fresh fingerprint from the store, otherwise run and store it"""
+    # The agent stack is only loaded for research that actually has to run
+    from research import run_research
+
+    start = time.perf_counter()
+    stored = store.get(trip_data)
+    if stored is not None:
+        text, original_metrics, age_seconds = stored
+        return text, {
+            "mode": "stored",
+            "source_mode": original_metrics.get("mode"),
+            "age_seconds": age_seconds,
+            "total_seconds": time.perf_counter() - start,
+        }
+    if policy:
+        text, metrics = policy.call(run_research, llm, search, trip_data, checkpoint=checkpoint)
+    else:
+        text, metrics = run_research(llm, search, trip_data, checkpoint=checkpoint)
+    # An incomplete run is still shown to this session, but never served to other trips from the store
+    if worth_storing(text, metrics):
+        store.put(trip_data, text, metrics)
+    return text, metrics
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "llm_responses.sqlite3")
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so indentation-only changes map to the same key"""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def make_cache_key(model, prompt, research=None):
+    """Build a stable key from model, normalized prompt and research hash"""
+    research_hash = hashlib.sha256((research or "").encode("utf-8")).hexdigest()
+    payload = json.dumps([model, normalize_prompt(prompt), research_hash])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """On-disk LRU cache with TTL for LLM responses, backed by SQLite
+
+    Entries expire after ttl_seconds unless set() is given a TTL of their own.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=500, ttl_seconds=24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL, expires_at REAL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(responses)")]
+        if "expires_at" not in columns:
+            self._conn.execute("ALTER TABLE responses ADD COLUMN expires_at REAL")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, COALESCE(expires_at, created_at + ?) FROM responses WHERE key = ?",
+                (self.ttl_seconds, key),
+            ).fetchone()
+            if row is None or now > row[1]:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value, ttl_seconds=None):
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, expires_at),
+            )
+            # Evict expired entries first, then least recently used ones over the size bound
+            self._conn.execute(
+                "DELETE FROM responses WHERE COALESCE(expires_at, created_at + ?) < ?", (self.ttl_seconds, now)
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self),
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def cached_invoke(cache, llm, prompt, research=None, policy=None):
+    """Invoke the LLM, serving identical (model, prompt, research) calls from the cache; returns (content, cache hit)"""
+    key = make_cache_key(getattr(llm, "model_name", ""), prompt, research)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, True
+    content = (policy.call(llm.invoke, prompt) if policy else llm.invoke(prompt)).content
+    cache.set(key, content)
+    return content, False
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+
+DEFAULT_SEARCH_CACHE_PATH = os.path.join(".cache", "search_results.sqlite3")
+
+# Prices change quickly, attractions rarely; everything else sits in between
+DEFAULT_SEARCH_TTLS = {
+    "price": 6 * 3600,
+    "attraction": 7 * 24 * 3600,
+    "default": 24 * 3600,
+}
+PRICE_KEYWORDS = (
+    "price", "prices", "cost", "costs", "cheap", "budget", "fare", "fares", "rate", "rates",
+    "deal", "deals", "booking", "hotel", "hotels", "hostel", "hostels", "inr", "rupees", "₹",
+)
+ATTRACTION_KEYWORDS = (
+    "things to do", "attractions", "places to visit", "sightseeing", "itinerary", "beach", "beaches",
+    "temple", "temples", "museum", "museums", "fort", "forts", "history", "culture", "activities",
+)
+# SerpAPI parameters that change which results a query returns
+LOCALE_PARAMS = ("engine", "google_domain", "gl", "hl", "location")
+
+
+def search_ttls_from_env():
+    """DEFAULT_SEARCH_TTLS overridden by SEARCH_CACHE_TTL_PRICE_SECONDS, _ATTRACTION_SECONDS and SEARCH_CACHE_TTL_SECONDS"""
+    return {
+        "price": int(os.getenv("SEARCH_CACHE_TTL_PRICE_SECONDS", str(DEFAULT_SEARCH_TTLS["price"]))),
+        "attraction": int(os.getenv("SEARCH_CACHE_TTL_ATTRACTION_SECONDS", str(DEFAULT_SEARCH_TTLS["attraction"]))),
+        "default": int(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(DEFAULT_SEARCH_TTLS["default"]))),
+    }
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query).strip().strip("?.!").lower()
+
+
+def classify_query(query):
+    """Bucket a query as price, attraction or default so it gets the matching TTL"""
+    query = normalize_query(query)
+    words = set(re.findall(r"[\w₹]+", query))
+    if any(k in words or (" " in k and k in query) for k in PRICE_KEYWORDS):
+        return "price"
+    if any(k in words or (" " in k and k in query) for k in ATTRACTION_KEYWORDS):
+        return "attraction"
+    return "default"
+
+
+class CachedSearch:
+    """Serve repeated SerpAPI queries from a ResponseCache, stored as zlib-compressed JSON"""
+
+    def __init__(self, search, cache, ttls=None, quota=None):
+        self.search = search
+        self.cache = cache
+        self.ttls = dict(DEFAULT_SEARCH_TTLS, **(ttls or {}))
+        self.quota = quota
+
+    def _key(self, method, query):
+        params = getattr(self.search, "params", None) or {}
+        locale = {name: params.get(name) for name in LOCALE_PARAMS if params.get(name) is not None}
+        payload = json.dumps([method, normalize_query(query), locale], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _call(self, method, query):
+        key = self._key(method, query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return json.loads(zlib.decompress(cached))
+        if self.quota is not None:
+            # Only searches that actually reach SerpAPI spend quota
+            self.quota.acquire()
+        result = getattr(self.search, method)(query)
+        compact = zlib.compress(json.dumps(result, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+        self.cache.set(key, compact, ttl_seconds=self.ttls[classify_query(query)])
+        return result
+
+    def run(self, query):
+        return self._call("run", query)
+
+    def results(self, query):
+        return self._call("results", query)
+
+    def stats(self):
+        """Cache stats plus the SerpAPI searches each hit saved"""
+        return dict(self.cache.stats(), saved_searches=self.cache.hits)
@@ -0,0 +1,14 @@
+import time
+
+
+def timed_stream(llm, prompt, timings, policy=None):
+    """Yield content tokens from llm.stream, recording time-to-first-token and total time in timings"""
+    start = time.perf_counter()
+    for chunk in policy.stream(llm.stream, prompt) if policy else llm.stream(prompt):
+        if not chunk.content:
+            continue
+        if "ttft_seconds" not in timings:
+            timings["ttft_seconds"] = time.perf_counter() - start
+        yield chunk.content
+    timings["total_seconds"] = time.perf_counter() - start
+    timings.setdefault("ttft_seconds", timings["total_seconds"])